@@ -0,0 +1,95 @@
+# script for comparing the precisions of the stylegan3 generators
+# times each precision on a fixed set of seeds and reports the speedup & the pixel error
+# against fp32 (see --image_precision of generate.py)
+#
+# zeno gries 2023
+
+from typing import Union, List
+
+import os
+import time
+import click
+import logging
+import numpy as np
+import torch
+
+from generators.image_generator import ImageGenerator
+from generators.precision import PRECISIONS
+
+
+# click parsers
+def parse_comma_list(s: Union[str, List]) -> List[str]:
+    if isinstance(s, list):
+        return s
+
+    return [item for item in map(str.strip, str(s).split(','))]
+
+
+# yapf: disable
+@click.command()
+@click.option('--stylegan_dir', type=click.Path(exists=True, file_okay=False), help='directory of stylegan3 model file (formatted like this: \'folder/{{role}}_stylegan3_model.pkl\')', required=True)
+@click.option('--roles',        type=parse_comma_list,                         help='list of roles (e.g \'artist, scientist\'). must be all lower case', required=True)
+@click.option('--precisions',   type=parse_comma_list, default=PRECISIONS,     help='precisions to compare against fp32 (e.g. \'bf16, int8\')', required=True)
+@click.option('--seeds',        type=int, default=16,                          help='how many seeds (starting at 0) are generated with each precision', required=True)
+@click.option('--batch',        type=int, default=4,                           help='how many selfies are generated in one forward pass', required=True)
+@click.option('--threads',      type=int, default=0,                           help='intra-op threads of torch (0 keeps the default)')
+@click.option('--verbose',      is_flag=True,                                  help='print additional information')
+# yapf: enable
+def compare_precision(
+        stylegan_dir: str,
+        roles: List[str],
+        precisions: List[str],
+        seeds: int,
+        batch: int,
+        threads: int,
+        verbose: bool
+    ) -> None:
+    """
+    compares the speed & the pixel error of each precision against fp32.
+    """
+
+    # setup logging
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        )
+    logger = logging.getLogger(__name__)
+
+    if threads:
+        torch.set_num_threads(threads)
+
+    for precision in precisions:
+        if precision not in PRECISIONS:
+            raise click.BadParameter(f"unknown precision '{precision}'")
+    precisions = ['fp32'] + [p for p in precisions if p != 'fp32']
+
+    for role in roles:
+        network = os.path.join(stylegan_dir, f'{role}_stylegan3_model.pkl')
+
+        images = {}
+        elapsed = {}
+        for precision in precisions:
+            image_G = ImageGenerator(logger, network, precision=precision)
+            image_G.generate_batch(list(range(batch)))  # warm up
+            start = time.time()
+            images[precision] = np.concatenate([
+                np.stack([
+                    np.asarray(image) for image in image_G.generate_batch(
+                        list(range(i, min(i + batch, seeds)))
+                        )
+                    ]) for i in range(0, seeds, batch)
+                ]).astype(np.int16)
+            elapsed[precision] = (time.time() - start) / seeds
+
+        for precision in precisions:
+            diff = np.abs(images[precision] - images['fp32'])
+            logger.info(
+                f"'{role}' with {precision}: {elapsed[precision]:.3f}s per image, "
+                f"speedup {elapsed['fp32'] / elapsed[precision]:.2f}x, "
+                f"pixel error mean {diff.mean():.2f} / max {diff.max()}"
+                )
+
+
+if __name__ == '__main__':
+    compare_precision()
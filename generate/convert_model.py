@@ -0,0 +1,56 @@
+# script for converting the stylegan3 model of each writer to a G_ema-only file
+# the training pickles also hold G, D & the augment pipe. the converted files only hold
+# G_ema with its weights in a separate file, which the image generators memory-map
+#
+# zeno gries 2023
+
+from typing import Union, List
+
+import os
+import time
+import click
+import logging
+
+from generators.fast_model import convert_network, get_fast_paths
+
+
+# click parsers
+def parse_comma_list(s: Union[str, List]) -> List[str]:
+    if isinstance(s, list):
+        return s
+
+    return [item for item in map(str.strip, str(s).split(','))]
+
+
+# yapf: disable
+@click.command()
+@click.option('--stylegan_dir', type=click.Path(exists=True, file_okay=False), help='directory of stylegan3 model file (formatted like this: \'folder/{{role}}_stylegan3_model.pkl\')', required=True)
+@click.option('--roles',        type=parse_comma_list,                         help='list of roles (e.g \'artist, scientist\'). must be all lower case', required=True)
+@click.option('--verbose',      is_flag=True,                                  help='print additional information')
+# yapf: enable
+def convert_model(stylegan_dir: str, roles: List[str], verbose: bool) -> None:
+    """
+    converts the network pickle of each role to a G_ema-only file with memory-mapped weights.
+    """
+
+    # setup logging
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        )
+    logger = logging.getLogger(__name__)
+
+    for role in roles:
+        network = os.path.join(stylegan_dir, f'{role}_stylegan3_model.pkl')
+
+        start = time.time()
+        logger.debug(f'converting "{network}"...')
+        num_tensors = convert_network(network)
+        logger.info(
+            f"converted G_ema of '{role}' with {num_tensors} tensors to {list(get_fast_paths(network))} in {time.time() - start:.1f}s"
+            )
+
+
+if __name__ == '__main__':
+    convert_model()
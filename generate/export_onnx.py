@@ -0,0 +1,97 @@
+# script for exporting the stylegan3 generator of each writer to onnx
+# the exports are saved next to the .pkl files and are run by the image generators
+# with onnx runtime's cpu provider (--image_backend onnx)
+#
+# zeno gries 2023
+
+from typing import Union, List
+
+import os
+import time
+import click
+import pickle
+import logging
+import numpy as np
+
+from generators.image_generator import ImageGenerator
+from generators.onnx_generator import export_onnx as export, get_onnx_paths
+
+
+# click parsers
+def parse_comma_list(s: Union[str, List]) -> List[str]:
+    if isinstance(s, list):
+        return s
+
+    return [item for item in map(str.strip, str(s).split(','))]
+
+
+# yapf: disable
+@click.command()
+@click.option('--stylegan_dir', type=click.Path(exists=True, file_okay=False), help='directory of stylegan3 model file (formatted like this: \'folder/{{role}}_stylegan3_model.pkl\')', required=True)
+@click.option('--roles',        type=parse_comma_list,                         help='list of roles (e.g \'artist, scientist\'). must be all lower case', required=True)
+@click.option('--batch',        type=int, default=4,                           help='batch size the generator is exported at (should match --image_batch of generate.py)', required=True)
+@click.option('--noise_mode',   type=click.Choice(['const', 'random', 'none']), default='const', help='noise mode that gets baked into the export', required=True)
+@click.option('--benchmark',    type=int, default=0,                           help='if nonzero, times this many batches with the torch & onnx backends after exporting')
+@click.option('--threads',      type=int, default=0,                           help='intra-op threads of the onnx backend for the benchmark (0 lets onnx runtime decide)')
+@click.option('--verbose',      is_flag=True,                                  help='print additional information')
+# yapf: enable
+def export_onnx(
+        stylegan_dir: str,
+        roles: List[str],
+        batch: int,
+        noise_mode: str,
+        benchmark: int,
+        threads: int,
+        verbose: bool
+    ) -> None:
+    """
+    exports the mapping & synthesis networks of each role to onnx files next to its .pkl.
+    """
+
+    # setup logging
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        )
+    logger = logging.getLogger(__name__)
+
+    for role in roles:
+        network = os.path.join(stylegan_dir, f'{role}_stylegan3_model.pkl')
+
+        logger.debug(f'loading networks from "{network}"...')
+        with open(network, 'rb') as file:
+            G = pickle.load(file)['G_ema'].cpu()
+
+        logger.debug(f"exporting generator for '{role}' at batch size {batch}...")
+        export(G, network, batch, noise_mode=noise_mode)
+        logger.info(
+            f"saved onnx generator for '{role}' to {list(get_onnx_paths(network))}"
+            )
+
+        # compare the backends on the same seeds
+        if benchmark:
+            images = {}
+            for backend in ['torch', 'onnx']:
+                image_G = ImageGenerator(
+                    logger, network, backend=backend, threads=threads
+                    )
+                image_G.generate_batch(list(range(batch)), noise_mode=noise_mode)  # warm up
+                start = time.time()
+                for i in range(benchmark):
+                    images[backend] = image_G.generate_batch(
+                        list(range(i * batch, (i + 1) * batch)),
+                        noise_mode=noise_mode
+                        )
+                elapsed = (time.time() - start) / (benchmark * batch)
+                logger.info(f"'{role}' with {backend}: {elapsed:.3f}s per image")
+
+            diff = max(
+                np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16)).max()
+                for a, b in zip(images['torch'], images['onnx'])
+                )
+            logger.info(f"'{role}' max pixel difference torch vs. onnx: {diff}")
+
+
+if __name__ == '__main__':
+    export_onnx()
@@ -4,13 +4,10 @@
 #
 # zeno gries 2023
 
-from typing import Union, List, Dict
-from queue import Queue
-from PIL.Image import Image
+from typing import Union, List, Dict, Tuple
 
 import os
 import multiprocessing
-import queue
 import re
 import time
 import random
@@ -19,12 +16,20 @@ import click
 import json
 import shortuuid
 import logging
+import torch
 from datetime import datetime
-from io import BytesIO
 from walrus import Database, Hash
 
-from generators.image_generator import ImageGenerator
+from generators.image_generator import ImageGenerator, BACKENDS
+from generators.precision import PRECISIONS
 from generators.text_generator import TextGenerator
+from generators.conversation_buffer import ConversationBuffer
+from generators.latent_bank import get_bank_path
+from generators.selfie_pool import SelfiePool
+from generators.selfie_ring import SelfieRing
+from generators.selfie_scheduler import SelfieScheduler
+from generators.tensor_store import TensorStore
+from generators.thread_tuner import tune, apply_settings
 
 
 # click parsers
@@ -91,33 +96,127 @@ class Prompts:
 
 
 def generate_images(
-        stylegan_dir, logger: logging.Logger, **queues: Queue
+        stylegan_dir,
+        logger: logging.Logger,
+        consumed: multiprocessing.Event,  # set by the rings, whenever a selfie is taken out
+        batch_size: int = 1,
+        w_bank: bool = False,
+        backend: str = 'torch',
+        threads: int = 0,
+        interop: int = 0,
+        cpus: List[int] = None,
+        patch_network: bool = False,
+        precision: str = 'fp32',
+        pools: Dict[str, SelfiePool] = None,
+        **rings: SelfieRing
     ) -> None:
+    # keep the image process from competing with the other processes for all cores
+    apply_settings(threads, interop, cpus)
+    logger.debug(
+        f'image process for {list(rings)} uses {torch.get_num_threads()} threads'
+        )
+
     # setup image generators
     image_Gs: Dict[str, ImageGenerator] = {}
-    for role in queues:
+    for role in rings:
+        network = os.path.join(stylegan_dir, f'{role}_stylegan3_model.pkl')
+        bank = get_bank_path(network)
+        if w_bank and not os.path.isfile(bank):
+            logger.warning(
+                f"no w latent bank found for '{role}' at \"{bank}\". using the mapping network."
+                )
         image_Gs[role] = ImageGenerator(
-            logger, os.path.join(stylegan_dir, f'{role}_stylegan3_model.pkl')
+            logger,
+            network,
+            w_bank=bank if w_bank and os.path.isfile(bank) else None,
+            backend=backend,
+            threads=threads,
+            patch_network=patch_network,
+            precision=precision
+            )
+
+    # keep the tensors the role networks have in common only once
+    store = TensorStore()
+    for role, image_G in image_Gs.items():
+        saved = image_G.share_tensors(store)
+        if saved:
+            logger.debug(f"'{role}' shares {saved / 2**20:.1f} MiB with the other roles")
+    if store.bytes_saved:
+        logger.info(
+            f'shared tensors of {list(image_Gs)} save {store.bytes_saved / 2**20:.1f} of {store.bytes_total / 2**20:.1f} MiB'
             )
 
     # set image seed starting points
     image_seed = {}
-    for role in queues:
+    for role in rings:
         image_seed[role] = random.randint(
             0, 10000
             )  # make sure it is a random seed so it always starts at a different point
     logger.debug(f'setup image seeds: {image_seed}')
 
-    # generate images
+    # selfies that did not fit into the rings yet & the largest selfie size so far
+    pending: Dict[str, List[Tuple[bytes, int]]] = {role: [] for role in rings}
+    image_size: Dict[str, int] = {role: 0 for role in rings}
+    scheduler = SelfieScheduler(list(rings), batch_size)
+
+    # generate images (in batches of consecutive seeds), whenever a ring runs low
     while True:
-        for role, _queue in queues.items():
-            if _queue.qsize() < 3:
+        consumed.clear()
+
+        now = time.time()
+        blocked = set()
+        for role, ring in rings.items():
+            scheduler.observe_taken(role, ring.taken(), now)
+            while pending[role] and ring.put(*pending[role][0]):
+                pending[role].pop(0)
+            # only refill, when another batch of the largest selfies so far fits (or the ring ran empty)
+            if pending[role] or (
+                len(ring) and ring.free() < image_size[role] * batch_size
+                ):
+                blocked.add(role)
+
+        role = scheduler.next_role(
+            {role: len(ring) for role, ring in rings.items()}, blocked
+            )
+        if role is not None:
+            seeds = list(range(image_seed[role], image_seed[role] + batch_size))
+            logger.debug(
+                f"generating images for '{role}' with seeds: {seeds} (buffer depth: {scheduler.depth(role)})"
+                )
+            start = time.time()
+            # encode here, so only the compact jpeg bytes cross the process boundary
+            for seed, image_data in zip(
+                seeds, image_Gs[role].generate_jpegs(seeds)
+                ):
+                image_size[role] = max(image_size[role], len(image_data))
+                pending[role].append((image_data, seed))
+            scheduler.observe_batch(role, time.time() - start)
+            while pending[role] and rings[role].put(*pending[role][0]):
+                pending[role].pop(0)
+            image_seed[role] += batch_size
+            continue
+
+        # fill the selfie pools, when all rings are stocked up
+        if pools:
+            role = next(
+                (role for role, pool in pools.items() if not pool.full()), None
+                )
+            if role is not None:
+                seeds = list(
+                    range(image_seed[role], image_seed[role] + batch_size)
+                    )
                 logger.debug(
-                    f"generating image for '{role}' with seed: {image_seed[role]}"
+                    f"generating pool images for '{role}' with seeds: {seeds}"
                     )
-                _queue.put(image_Gs[role].generate(image_seed[role]))
-                image_seed[role] += 1
-        time.sleep(1)
+                for seed, image_data in zip(
+                    seeds, image_Gs[role].generate_jpegs(seeds)
+                    ):
+                    pools[role].put(image_data, seed)
+                image_seed[role] += batch_size
+                continue  # check on the rings again after every batch
+
+        # sleep until a selfie gets taken (the timeout keeps the rate estimates & pools up to date)
+        consumed.wait(timeout=5)
 
 
 # yapf: disable
@@ -128,7 +227,21 @@ def generate_images(
 @click.option('--top_k',            type=int, default=0,                           help='if nonzero, limits the sampled tokens to the top k values', required=True)
 @click.option('--top_p',            type=float, default=0.7,                       help='if nonzero, limits the sampled tokens to the cumulative probability', required=True)
 @click.option('--best_of',          type=int, default=1,                           help='how many generations should be done at a time (if n > 1, the result will be selected randomly', required=True)
+@click.option('--stop_messages',    type=int, default=0,                           help='if nonzero, stops a generation once it contains this many complete messages (otherwise the full 128 tokens are generated)', required=True)
+@click.option('--prompt_cache',     is_flag=True,                                  help='warm start gpt-2 from the stored starting prompts (see make_prompt_cache.py). runs then start without the last messages of the previous run')
+@click.option('--constrained',      is_flag=True,                                  help='only let gpt-2 start a line with the role format of one of the roles')
+@click.option('--stop_percentile',  type=float, default=0,                         help='if nonzero, limits the generation length to stop_messages times this percentile of the observed message lengths', required=True)
 @click.option('--stylegan_dir',     type=click.Path(exists=True, file_okay=False), help='directory of stylegan3 model file (formatted like this: \'folder/{{role}}_stylegan3_model.pkl\')', required=True)
+@click.option('--image_batch',      type=int, default=4,                           help='how many selfies per role are generated in one forward pass when refilling', required=True)
+@click.option('--w_bank',           is_flag=True,                                  help='feed the stylegan3 synthesis from precomputed w latent banks (see make_latent_bank.py), if present')
+@click.option('--image_buffer',     type=int, default=2**20,                       help='size of the shared-memory selfie buffer per role in bytes', required=True)
+@click.option('--image_backend',    type=click.Choice(BACKENDS), default='torch',  help='run the stylegan3 generators eagerly (torch), from traced cpu artifacts (traced, see make_traced_generator.py) or with onnx runtime (onnx, see export_onnx.py), if present', required=True)
+@click.option('--image_threads',    type=int, default=0,                           help='intra-op threads of each image process, for torch & onnx runtime (0 keeps the default)', required=True)
+@click.option('--image_workers',    is_flag=True,                                  help='run one image process per role instead of one for all roles')
+@click.option('--image_precision',  type=click.Choice(PRECISIONS), default='fp32', help='precision of the stylegan3 synthesis with the torch backend: fp32, bf16 (synthesis layers in bfloat16) or int8 (dynamically quantized fully connected layers, cpu only)', required=True)
+@click.option('--image_patches',    is_flag=True,                                  help='patch the pickled stylegan3 code with the inference optimizations of torch_utils/import_hooks.py (torch backend)')
+@click.option('--text_threads',     type=int, default=0,                           help='intra-op threads of the text generation (0 keeps the default)', required=True)
+@click.option('--autotune',         is_flag=True,                                  help='measure the split of threads, interop threads & cores between the text & image processes at startup (cached per host) instead of using --text_threads & --image_threads')
 @click.option('--sound_dir',        type=click.Path(exists=True, file_okay=False), help='directory where the notification sounds are located', required=True)
 @click.option('--prompts_file',     type=click.Path(exists=True, dir_okay=False),  help='path to json file with starting prompts', required=True)
 @click.option('--run_length',       type=int, default=50,                          help='how long is an average conversation run, before the next prompt gets set. set to 0 to deactive', required=True)
@@ -148,6 +261,8 @@ def generate_images(
 @click.option('--rapid',            is_flag=True,                                  help='skip all wait times')
 @click.option('--verbose',          is_flag=True,                                  help='print additional information')
 @click.option('--out_dir',          type=click.Path(file_okay=False),              help='directory to generate the conversation to (messages in a .json file and images as .jpgs)', required=False)
+@click.option('--pool_dir',         type=click.Path(file_okay=False),              help='directory for the pregenerated selfies, which survive restarts', required=False)
+@click.option('--pool_size',        type=int, default=16,                          help='how many pregenerated selfies are kept per role (only with pool_dir)', required=True)
 @click.option('--conversation_dir', type=click.Path(file_okay=False, exists=True), help='directory to generate the conversation from (from previous generation)', required=False)
 # yapf: enable
 def generate(
@@ -157,7 +272,21 @@ def generate(
         top_k: int,
         top_p: float,
         best_of: int,
+        stop_messages: int,
+        stop_percentile: float,
+        constrained: bool,
+        prompt_cache: bool,
         stylegan_dir: str,
+        image_batch: int,
+        image_buffer: int,
+        w_bank: bool,
+        image_backend: str,
+        image_threads: int,
+        image_workers: bool,
+        image_patches: bool,
+        image_precision: str,
+        text_threads: int,
+        autotune: bool,
         sound_dir: str,
         prompts_file: str,
         run_length: int,
@@ -176,7 +305,9 @@ def generate(
         logfile: str,
         rapid: bool,
         verbose: bool,
+        pool_size: int,
         out_dir: str = None,
+        pool_dir: str = None,
         conversation_dir: str = None
     ) -> None:
     """
@@ -211,7 +342,21 @@ def generate(
     logger.info(f'top_k: {top_k}')
     logger.info(f'top_p: {top_p}')
     logger.info(f'best_of: {best_of}')
+    logger.info(f'stop_messages: {stop_messages}')
+    logger.info(f'stop_percentile: {stop_percentile}')
+    logger.info(f'constrained: {constrained}')
+    logger.info(f'prompt_cache: {prompt_cache}')
     logger.info(f'stylegan_dir: {stylegan_dir}')
+    logger.info(f'image_batch: {image_batch}')
+    logger.info(f'image_buffer: {image_buffer}')
+    logger.info(f'w_bank: {w_bank}')
+    logger.info(f'image_backend: {image_backend}')
+    logger.info(f'image_threads: {image_threads}')
+    logger.info(f'image_workers: {image_workers}')
+    logger.info(f'image_patches: {image_patches}')
+    logger.info(f'image_precision: {image_precision}')
+    logger.info(f'text_threads: {text_threads}')
+    logger.info(f'autotune: {autotune}')
     logger.info(f'sound_dir: {sound_dir}')
     logger.info(f'prompts_file: {prompts_file}')
     logger.info(f'run_length: {run_length}')
@@ -227,6 +372,8 @@ def generate(
     logger.info(f'read_deviation: {read_deviation}')
     logger.info(f'runs: {runs}')
     logger.info(f'memory: {memory}')
+    logger.info(f'pool_dir: {pool_dir}')
+    logger.info(f'pool_size: {pool_size}')
     logger.info(f'rapid: {rapid}')
     logger.info(f'verbose: {verbose}')
 
@@ -246,28 +393,77 @@ def generate(
         with open(os.path.join(conversation_dir, 'messages.json')) as file:
             loaded_messages = json.load(file)
 
+    rings: Dict[str, SelfieRing] = {}
+    processes: List[multiprocessing.Process] = []
     try:
         if not conversation_dir:
-            # setup queues
-            queues: Dict[str, Queue] = {}
-            for role in roles:
-                queues[role] = multiprocessing.Queue()
-
-            # start image generation process
-            process = multiprocessing.Process(
-                target=generate_images,
-                kwargs=({
-                    'logger': logger, 'stylegan_dir': stylegan_dir, **queues
-                    })
-                )
-            process.start()
-            logger.info('setup image generators.')
+            # image generation processes (one for all roles or one per role)
+            role_groups = [[role] for role in roles] if image_workers else [roles]
+
+            # setup shared-memory selfie rings (taking a selfie out wakes up the image process of its role)
+            events = [multiprocessing.Event() for _ in role_groups]
+            for worker_roles, consumed in zip(role_groups, events):
+                for role in worker_roles:
+                    rings[role] = SelfieRing(image_buffer, consumed=consumed)
+
+            # setup selfie pools
+            pools: Dict[str, SelfiePool] = {}
+            if pool_dir:
+                for role in roles:
+                    pools[role] = SelfiePool(pool_dir, role, pool_size)
+                logger.info(
+                    f'setup selfie pools: { {role: len(pool) for role, pool in pools.items()} }'
+                    )
+
+            # thread settings of the text & image processes
+            text_settings = {'threads': text_threads}
+            image_settings = {'threads': image_threads}
+            if autotune:
+                tuned = tune(logger)
+                text_settings = tuned['text']
+                image_settings = tuned['image']
+
+            # start image generation processes
+            for i, worker_roles in enumerate(role_groups):
+                worker_settings = dict(image_settings)
+                if autotune and len(role_groups) > 1:
+                    # the tuned image share of the cores is split between the image processes
+                    worker_settings['threads'] = max(
+                        1, image_settings['threads'] // len(role_groups)
+                        )
+                    if image_settings['cpus']:
+                        worker_settings['cpus'] = image_settings['cpus'][
+                            i::len(role_groups)] or image_settings['cpus']
+                processes.append(
+                    multiprocessing.Process(
+                        target=generate_images,
+                        kwargs=({
+                            'logger': logger,
+                            'stylegan_dir': stylegan_dir,
+                            'batch_size': image_batch,
+                            'w_bank': w_bank,
+                            'backend': image_backend,
+                            **worker_settings,
+                            'patch_network': image_patches,
+                            'precision': image_precision,
+                            'pools': {
+                                role: pools[role]
+                                for role in worker_roles if role in pools
+                                },
+                            'consumed': events[i],
+                            **{role: rings[role] for role in worker_roles}
+                            })
+                        )
+                    )
+                processes[-1].start()
+            logger.info(f'setup image generators in {len(processes)} process(es).')
 
             # setup text generators
-            text_G = TextGenerator(logger, model_folder=gpt_dir)
+            apply_settings(**text_settings)
+            text_G = TextGenerator(
+                logger, model_folder=gpt_dir, prompt_cache=prompt_cache
+                )
             logger.info('setup text generator.')
-        else:
-            process = None
 
         # setup writing states
         writing_state: Dict[str, Hash] = {}
@@ -292,6 +488,15 @@ def generate(
             fr'(?!{re.escape(image_string)}){re.escape(role_holder[0])}(?P<sender>\w+){re.escape(role_holder[1])}'
             )
 
+        # buffer for the surplus messages & candidates of each completion
+        conversation = ConversationBuffer(split_pattern, role_pattern)
+
+        # constrain the line openings to the roles
+        if constrained and not conversation_dir:
+            text_G.constrain([
+                f'{role_holder[0]}{role}{role_holder[1]}' for role in roles
+                ])
+
         # setup prompts
         with open(prompts_file) as file:
             prompts_list = json.load(file)
@@ -360,6 +565,10 @@ def generate(
                 logger.info(
                     f'conversation run ended. new run length: {current_run_length}.'
                     )
+                if not conversation_dir:
+                    logger.info(
+                        f'wasted generations: {conversation.wasted_rate():.1%} of {conversation.completions} (constrained: {constrained})'
+                        )
 
                 if not rapid: time.sleep(run_time)
 
@@ -375,26 +584,30 @@ def generate(
             # generate a message
             if not conversation_dir:
                 if not current_run_length <= 0 or run_length == 0:
-                    current_prompt = '\n'.join([
-                        line.strip() for line in prompt
-                        ]) + '\n'
-                    responses = text_G.generate(
-                        current_prompt,
-                        max_length=128,
-                        temperature=temp,
-                        top_k=top_k,
-                        top_p=top_p,
-                        n=best_of,  # batch_size=best_of
-                        ).replace(current_prompt, '')
-                    # split the message so it only contains single responses in a list
+                    # only run gpt-2, when the messages of the last completions are used up
+                    if conversation.next() is None:
+                        current_prompt = '\n'.join([
+                            line.strip() for line in prompt
+                            ]) + '\n'
+                        conversation.fill(
+                            text_G.generate_candidates(
+                                current_prompt,
+                                max_length=128,
+                                temperature=temp,
+                                top_k=top_k,
+                                top_p=top_p,
+                                n=best_of,  # batch_size=best_of
+                                stop_pattern=role_pattern,
+                                stop_messages=stop_messages,
+                                length_percentile=stop_percentile
+                                )
+                            )
+                        logger.debug(
+                            f'buffered {len(conversation)} messages. {conversation.completions} completions for {conversation.displayed} messages so far.'
+                            )
                     responses_list = [
-                        response.strip(
-                            ' '
-                            )  # strip any leading or trailing spaces (but not newlines)
-                        for response in re.split(split_pattern, responses)
-                        if re.search(role_pattern, response) is
-                        not None  # response must include a sender to be valid
-                        ]
+                        conversation.next()
+                        ] if conversation.next() is not None else []
                 else:
                     # if conversation run is at an end, get a new prompt from command line parameters
                     responses_list = [prompts.get()]
@@ -403,6 +616,10 @@ def generate(
                         * random.uniform(run_deviation[0], run_deviation[1])
                         )
                     new_run = True
+                    if prompt_cache:
+                        prompt.clear()  # start from the new prompt alone, as it was stored by make_prompt_cache.py
+                    text_G.reset()
+                    conversation.clear()
 
                     # stop if designated runs are reached
                     if runs:
@@ -418,6 +635,10 @@ def generate(
                         * random.uniform(run_deviation[0], run_deviation[1])
                         )
                     new_run = True
+                    if prompt_cache:
+                        prompt.clear()  # start from the new prompt alone, as it was stored by make_prompt_cache.py
+                    text_G.reset()
+                    conversation.clear()
 
                     logger.warning(
                         f'no valid messages. starting new run. new prompt: {responses_list[0]}. new run length: {current_run_length}. The new run will appear one line later in the log.'
@@ -443,49 +664,44 @@ def generate(
                 alt = ''
 
                 if not conversation_dir:
+                    if not new_run:
+                        conversation.accept()
+
                     # get prompt for the next generation
                     prompt.append(responses_list[0])
                     if len(prompt) > memory:
                         prompt.pop(0)
 
                     if image_string in text:
-                        # get image from queue
-                        image: Image = None
-                        while image is None:
-                            try:
-                                image = queues[sender].get()
-                            except queue.Empty:
+                        # after a restart the rings are still empty, so use the pregenerated selfies first
+                        image_data = None
+                        if pools and not len(rings[sender]):
+                            image_data = pools[sender].get()
+
+                        if image_data is None:
+                            # get encoded image from the ring
+                            selfie: Tuple[int, bytes] = rings[sender].get()
+                            if selfie is None:
                                 logger.warning(
-                                    f"queue for '{sender}' is empty. trying again in 1 second."
+                                    f"selfie ring for '{sender}' is empty. waiting for the image process."
                                     )
-                                time.sleep(1)
-
-                        # save image as binary
-                        image_output = BytesIO()
-                        image.save(
-                            image_output,
-                            'JPEG',
-                            quality=70,
-                            optimize=True,
-                            progressive=True
-                            )
+                            while selfie is None:
+                                time.sleep(0.1)
+                                selfie = rings[sender].get()
+                            logger.debug(
+                                f"got selfie for '{sender}' with seed {selfie[0]}"
+                                )
+                            image_data = selfie[1]
 
                         # save image to file, if outdir is set
                         if out_dir:
                             image_path = f'image_{str(image_counter).zfill(10)}.jpg'
-                            image.save(
-                                os.path.join(out_dir, image_path),
-                                'JPEG',
-                                quality=70,
-                                optimize=True,
-                                progressive=True
-                                )
+                            with open(
+                                os.path.join(out_dir, image_path), 'wb'
+                                ) as file:
+                                file.write(image_data)
                             image_counter += 1
 
-                        image_data = image_output.getvalue()
-
-                        image_output.close()
-
                         # get image alt
                         alt = f'selfie of {sender}'
 
@@ -585,6 +801,8 @@ def generate(
 
             else:
                 logger.warning('invalid sender or text')
+                if not conversation_dir:
+                    conversation.reject()
 
     except Exception as ex:
         logger.error(f'terminated because of error: {ex}')
@@ -592,12 +810,14 @@ def generate(
         logger.info('process ended by user')
     finally:
         if not conversation_dir:
-            logger.info('terminating subprocesses and closing queues...')
-            if process: process.terminate()
-            if process: process.join()
-            for _queue in queues.values():
-                if _queue: _queue.close()
-                if _queue: _queue.join_thread()
+            logger.info('terminating subprocesses and freeing selfie rings...')
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+            for ring in rings.values():
+                ring.close()
+                ring.unlink()
 
 
 if __name__ == '__main__':
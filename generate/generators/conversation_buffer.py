@@ -0,0 +1,94 @@
+from typing import Optional, List, Pattern
+
+import re
+
+
+class ConversationBuffer:
+    """
+    keeps the messages of a gpt-2 completion, that were generated after the first one, as the next
+    turns of the conversation. the other best_of candidates are kept as well, but only as
+    replacements for an invalid message, since they continue the conversation from the same point.
+    once a buffered message was displayed, the alternatives don't fit anymore & get dropped.
+    """
+    def __init__(
+            self,
+            split_pattern: Pattern,  # splits a completion into messages
+            role_pattern: Pattern  # a message must include a sender to be valid
+        ) -> None:
+
+        self._split_pattern = split_pattern
+        self._role_pattern = role_pattern
+
+        self._pending: List[str] = []  # next messages of the current completion
+        self._alternatives: List[List[str]] = []  # messages of the other candidates
+        self._used = False  # whether a message of the current completion was displayed
+
+        self.completions = 0  # number of times the buffer was filled (model invocations)
+        self.displayed = 0  # number of accepted messages
+        self.wasted = 0  # number of completions without any valid message
+
+    def __len__(self) -> int:
+        return len(self._pending) + sum(map(len, self._alternatives))
+
+    def _split(self, completion: str) -> List[str]:
+        messages = [
+            message.strip(
+                ' '
+                )  # strip any leading or trailing spaces (but not newlines)
+            for message in re.split(self._split_pattern, completion)
+            if re.search(self._role_pattern, message) is not None
+            ]
+        # the last message is probably cut off by the maximum length (the first one is always used)
+        if len(messages) > 1 and not messages[-1].endswith('\n'):
+            messages.pop()
+        return messages
+
+    def fill(self, completions: List[str]) -> None:
+        """
+        replaces the buffer with the messages of new completions (the first one is used first).
+        """
+        candidates = [self._split(completion) for completion in completions]
+        candidates = [messages for messages in candidates if messages]
+        self._pending = candidates.pop(0) if candidates else []
+        self._alternatives = candidates
+        self._used = False
+        self.completions += 1
+        if not self._pending:
+            self.wasted += 1
+
+    def next(self) -> Optional[str]:
+        """
+        returns the next message without removing it or None, if the buffer is empty.
+        """
+        return self._pending[0] if self._pending else None
+
+    def accept(self) -> None:
+        """
+        removes the next message after it was displayed. the conversation moved on, so the alternatives are dropped.
+        """
+        if self._pending:
+            self._pending.pop(0)
+            self.displayed += 1
+            self._used = True
+        self._alternatives = []
+
+    def reject(self) -> None:
+        """
+        drops the next message & the rest of its completion, because it was invalid. continues with an alternative, if any.
+        """
+        if not self._pending:
+            return
+        self._pending = self._alternatives.pop(0) if self._alternatives else []
+        # a completion is only wasted, if none of its messages made it to the screen
+        if not self._pending and not self._used:
+            self.wasted += 1
+
+    def wasted_rate(self) -> float:
+        """
+        returns the share of completions that were thrown away, because they had no valid message.
+        """
+        return self.wasted / self.completions if self.completions else 0.0
+
+    def clear(self) -> None:
+        self._pending = []
+        self._alternatives = []
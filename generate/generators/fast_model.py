@@ -0,0 +1,140 @@
+from typing import Dict, Any, List, Tuple
+
+import os
+import io
+import json
+import pickle
+import numpy as np
+import torch
+
+# alignment of the tensors in the weight file (in bytes)
+_ALIGN = 64
+
+
+def get_fast_paths(network: str) -> Tuple[str, str, str]:
+    """
+    returns the paths of the G_ema-only pickle, its weight file and its index belonging to a network .pkl file.
+    """
+    stem = os.path.splitext(network)[0]
+    return f'{stem}_gema.pkl', f'{stem}_gema.bin', f'{stem}_gema.json'
+
+
+def _source_stamp(network: str) -> Dict[str, Any]:
+    stat = os.stat(network)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def is_converted(network: str) -> bool:
+    """
+    returns True, if the network was converted & the .pkl did not change since then.
+    """
+    paths = get_fast_paths(network)
+    if not all(os.path.isfile(path) for path in paths):
+        return False
+    with open(paths[2]) as file:
+        return json.load(file)['source'] == _source_stamp(network)
+
+
+class _TensorPickler(pickle.Pickler):
+    """
+    pickles everything but the tensors, which are appended to the weight file instead.
+    """
+    def __init__(self, file, weights) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._weights = weights
+        self._ids: Dict[int, int] = {}
+        self.tensors: List[Dict[str, Any]] = []
+
+    def persistent_id(self, obj):
+        if not isinstance(obj, torch.Tensor):
+            return None
+        index = self._ids.get(id(obj))
+        if index is None:
+            array = obj.detach().cpu().contiguous().numpy()
+            offset = self._weights.tell()
+            offset += -offset % _ALIGN
+            self._weights.seek(offset)
+            self._weights.write(array.tobytes())
+            index = len(self.tensors)
+            self._ids[id(obj)] = index
+            self.tensors.append({
+                'offset': offset,
+                'dtype': array.dtype.str,
+                'shape': list(array.shape),
+                'parameter': isinstance(obj, torch.nn.Parameter)
+                })
+        return ('tensor', index)
+
+
+class _TensorUnpickler(pickle.Unpickler):
+    """
+    maps the tensors from the weight file instead of reading them.
+    """
+    def __init__(
+            self, file, weights: np.memmap, tensors: List[Dict[str, Any]]
+        ) -> None:
+        super().__init__(file)
+        self._weights = weights
+        self._tensors = tensors
+        self._loaded: Dict[int, torch.Tensor] = {}
+
+    def persistent_load(self, pid):
+        kind, index = pid
+        assert kind == 'tensor'
+        tensor = self._loaded.get(index)
+        if tensor is None:
+            spec = self._tensors[index]
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape']))
+            array = self._weights[spec['offset']:spec['offset'] + count * dtype.itemsize]
+            tensor = torch.from_numpy(array.view(dtype).reshape(spec['shape']))
+            if spec['parameter']:
+                tensor = torch.nn.Parameter(tensor, requires_grad=False)
+            self._loaded[index] = tensor
+        return tensor
+
+
+def convert_network(network: str) -> int:
+    """
+    writes G_ema of a network .pkl into a G_ema-only pickle & a weight file, that is memory-mapped when loading.
+    returns the number of tensors.
+    """
+    with open(network, 'rb') as file:
+        G = pickle.load(file)['G_ema']
+    pickle_path, weights_path, index_path = get_fast_paths(network)
+
+    # write to temporary files first, so a starting generator never sees a half written model
+    with open(f'{weights_path}.tmp', 'wb') as weights:
+        buffer = io.BytesIO()
+        pickler = _TensorPickler(buffer, weights)
+        pickler.dump(G)
+    with open(f'{pickle_path}.tmp', 'wb') as file:
+        file.write(buffer.getvalue())
+
+    index = {
+        'class_name': type(G).__name__,
+        'init_args': list(getattr(G, 'init_args', [])),
+        'init_kwargs': dict(getattr(G, 'init_kwargs', {})),
+        'tensors': pickler.tensors,
+        'source': _source_stamp(network)
+        }
+    with open(f'{index_path}.tmp', 'w') as file:
+        json.dump(index, file, default=str)
+
+    os.replace(f'{weights_path}.tmp', weights_path)
+    os.replace(f'{pickle_path}.tmp', pickle_path)
+    os.replace(f'{index_path}.tmp', index_path)
+    return len(pickler.tensors)
+
+
+def load_network(network: str) -> torch.nn.Module:
+    """
+    loads the converted G_ema of a network .pkl. the weights are mapped copy-on-write, so the
+    pages are shared between all processes that load the same network.
+    """
+    pickle_path, weights_path, index_path = get_fast_paths(network)
+    with open(index_path) as file:
+        tensors = json.load(file)['tensors']
+    weights = np.memmap(weights_path, dtype=np.uint8, mode='c')
+    with open(pickle_path, 'rb') as file:
+        return _TensorUnpickler(file, weights, tensors).load()
@@ -1,12 +1,25 @@
-from typing import Tuple
+from typing import Tuple, List
 
+import os
 import time
 import numpy as np
 import PIL.Image
 import pickle
 import torch
+from io import BytesIO
 from logging import Logger
 
+from torch_utils import misc, import_hooks
+from generators.latent_bank import LatentBank
+from generators.fast_model import is_converted, load_network
+from generators.tensor_store import TensorStore
+from generators.precision import PRECISIONS, enable_bf16, quantize_int8
+from generators.traced_generator import get_model_hash, get_traced_path, load_traced, to_uint8
+from generators.onnx_generator import OnnxGenerator, is_exported
+
+# backends the generator can run with
+BACKENDS = ['torch', 'traced', 'onnx']
+
 
 def make_transform(translate: Tuple[float, float], angle: float):
     m = np.eye(3)
@@ -21,6 +34,23 @@ def make_transform(translate: Tuple[float, float], angle: float):
     return m
 
 
+def encode_jpeg(image: PIL.Image) -> bytes:
+    """
+    encodes a selfie to jpeg. the same bytes get sent to redis & written to disk.
+    """
+    image_output = BytesIO()
+    image.save(
+        image_output,
+        'JPEG',
+        quality=70,
+        optimize=True,
+        progressive=True
+        )
+    image_data = image_output.getvalue()
+    image_output.close()
+    return image_data
+
+
 class ImageGenerator:
     """
     generates images from stylegan3 network .pkl file and returns them as pillow images.
@@ -28,31 +58,221 @@ class ImageGenerator:
     def __init__(
             self,
             logger: Logger,
-            network: str  # network pickle filename
+            network: str,  # network pickle filename
+            w_bank: str = None,  # optional precomputed w latent bank (see make_latent_bank.py)
+            backend: str = 'torch',  # 'torch', 'traced' (see make_traced_generator.py) or 'onnx' (see export_onnx.py)
+            threads: int = 0,  # intra-op threads of the onnx backend (0 lets onnx runtime decide)
+            patch_network: bool = False,  # apply the source patches of torch_utils.import_hooks when unpickling
+            precision: str = 'fp32'  # 'fp32', 'bf16' (synthesis layers in bfloat16) or 'int8' (dynamically quantized fully connected layers, cpu only)
         ) -> None:
 
+        assert backend in BACKENDS
+        assert precision in PRECISIONS
         self._logger = logger
 
-        # checking for cuda
-        cuda_avail = torch.cuda.is_available()
-        if cuda_avail:
-            self._logger.info('cuda is available for stylegan')
-            self._device = torch.device('cuda')
-        else:
-            self._logger.warning('cuda is not available for stylegan')
+        # looking for a traced or exported artifact (both run on the cpu without unpickling the network)
+        self._G = None
+        self._traced = None
+        self._onnx = None
+        meta = None
+        if backend == 'traced':
+            traced_path = get_traced_path(network)
+            if os.path.isfile(traced_path):
+                self._logger.debug(f'loading traced generator "{traced_path}"...')
+                self._traced, meta = load_traced(traced_path)
+                self._w_avg = self._traced.w_avg
+                self._logger.info(
+                    f'using traced generator "{traced_path}" (cpu)'
+                    )
+            else:
+                self._logger.warning(
+                    f'no traced generator found for "{network}" at "{traced_path}". using the network pickle.'
+                    )
+        elif backend == 'onnx':
+            if is_exported(network):
+                self._logger.debug(f'loading onnx generator for "{network}"...')
+                self._onnx = OnnxGenerator(network, threads=threads)
+                meta = self._onnx.meta
+                self._w_avg = torch.from_numpy(self._onnx.w_avg)
+                self._logger.info(
+                    f'using onnx generator for "{network}" (cpu, {threads or "default"} threads)'
+                    )
+            else:
+                self._logger.warning(
+                    f'no up to date onnx export found for "{network}". using the network pickle.'
+                    )
+
+        if meta is not None:
             self._device = torch.device('cpu')
+            self._z_dim: int = meta['z_dim']
+            self._c_dim: int = meta['c_dim']
+            self._num_ws: int = meta['num_ws']
+            self._batch: int = meta['batch_size']
+            self._noise_mode: str = meta['noise_mode']
+
+        if meta is None:
+            # checking for cuda
+            cuda_avail = torch.cuda.is_available()
+            if cuda_avail:
+                self._logger.info('cuda is available for stylegan')
+                self._device = torch.device('cuda')
+            else:
+                self._logger.warning('cuda is not available for stylegan')
+                self._device = torch.device('cpu')
+
+            # loading model (from the converted G_ema-only file, if there is an up to date one)
+            if patch_network:
+                import_hooks.enable()
+            if precision == 'bf16':
+                # lets the synthesis layers run in another dtype than the one they pick
+                import_hooks.enable(['stylegan3_layer_dtype'])
+            if is_converted(network):
+                self._logger.debug(
+                    f'loading converted G_ema of "{network}" (memory-mapped)...'
+                    )
+                self._G = load_network(network).to(self._device)
+            else:
+                self._logger.debug(f'loading networks from "{network}"... ', end='')
+                with open(network, 'rb') as file:
+                    self._G = pickle.load(file)['G_ema'].to(self._device)
+            self._logger.info('done')
+            if patch_network:
+                self._logger.info(f'network source patches: {import_hooks.applied}')
 
-        # loading model
-        self._logger.debug(f'loading networks from "{network}"... ', end='')
-        with open(network, 'rb') as file:
-            self._G = pickle.load(file)['G_ema'].to(self._device)
-        self._logger.info('done')
+            self._z_dim = self._G.z_dim
+            self._c_dim = self._G.c_dim
+            self._num_ws = self._G.mapping.num_ws
+            self._w_avg = self._G.mapping.w_avg
+
+        # reducing the precision (of the eager network only)
+        self._precision = 'fp32'
+        if precision != 'fp32':
+            if self._G is None:
+                self._logger.warning(
+                    f"precision '{precision}' only applies to the torch backend. using the {backend} generator as is."
+                    )
+            elif precision == 'int8' and self._device.type != 'cpu':
+                self._logger.warning(
+                    "precision 'int8' is only supported on the cpu. using 'fp32'."
+                    )
+            elif precision == 'bf16' and not enable_bf16(self._G):
+                self._logger.warning(
+                    f"the network code of \"{network}\" does not let the synthesis layers change their dtype. using 'fp32'."
+                    )
+            else:
+                self._precision = precision
+                if precision == 'int8':
+                    count = quantize_int8(self._G)
+                    self._logger.debug(f'quantized {count} fully connected layers to int8')
+                self._logger.info(f"running stylegan with precision '{precision}'")
 
         # empty label
-        self._label = torch.zeros([1, self._G.c_dim], device=self._device)
+        self._label = torch.zeros([1, self._c_dim], device=self._device)
 
         self._network = network
 
+        # loading w latent bank
+        self._w_bank = None
+        if w_bank:
+            bank = LatentBank(w_bank)
+            if bank.model_hash != get_model_hash(network):
+                # the latents of another (e.g. the not yet retrained) network would make the wrong selfies
+                self._logger.warning(
+                    f'w latent bank "{w_bank}" was not made with the current "{network}". using the mapping network (run make_latent_bank.py again).'
+                    )
+            else:
+                self._w_bank = bank
+                self._logger.info(
+                    f'using w latent bank "{w_bank}" for seeds {bank.seed_start} to {bank.seed_start + bank.num_seeds - 1}'
+                    )
+
+    def share_tensors(self, store: TensorStore) -> int:
+        """
+        shares the parameters & buffers of the network with the other generators in the store.
+        returns the number of bytes saved (traced & onnx generators don't share anything).
+        """
+        if self._G is None:
+            return 0
+        return store.share(self._G)
+
+    def _seeds_to_z(self, seeds: List[int]) -> torch.Tensor:
+        return torch.from_numpy(
+            np.concatenate([
+                np.random.RandomState(seed).randn(1, self._z_dim)
+                for seed in seeds
+                ])
+            ).to(self._device)
+
+    def map_seeds(self, seeds: List[int]) -> np.ndarray:
+        """
+        returns the untruncated w latents for the given seeds with shape [len(seeds), w_dim].
+        """
+        with misc.inference_mode():
+            ws = self._map(self._seeds_to_z(seeds))
+        return ws.cpu().numpy().astype(np.float32)
+
+    def _map(self, z: torch.Tensor) -> torch.Tensor:
+        """
+        runs the mapping network without truncation and returns w with shape [N, w_dim].
+        """
+        if self._traced is not None:
+            return self._run_batched(self._traced_mapping, z.float())
+        if self._onnx is not None:
+            return self._run_batched(self._onnx_mapping, z)
+        # the mapping network broadcasts the same w to all layers
+        c = self._label.expand(z.shape[0], -1)
+        return self._G.mapping(z, c, truncation_psi=1)[:, 0]
+
+    def _synthesize(
+            self, ws: torch.Tensor, transform: torch.Tensor, noise_mode: str
+        ) -> torch.Tensor:
+        """
+        runs the synthesis network on ws with shape [N, num_ws, w_dim] and returns uint8 images with shape [N, H, W, 3].
+        """
+        if self._G is None and noise_mode != self._noise_mode:
+            raise ValueError(
+                f"the generator was traced with noise mode '{self._noise_mode}', not '{noise_mode}'"
+                )
+        if self._traced is not None:
+            return self._run_batched(self._traced, ws, transform)
+        if self._onnx is not None:
+            return self._run_batched(self._onnx_synthesis, ws, transform)
+
+        if hasattr(self._G.synthesis, 'input'):
+            self._G.synthesis.input.transform.copy_(transform)
+        return to_uint8(self._G.synthesis(ws, noise_mode=noise_mode))
+
+    def _traced_mapping(self, z: torch.Tensor) -> torch.Tensor:
+        # the labels are made per chunk, so they have the batch size of the graph as well
+        return self._traced.mapping(z, self._label.expand(z.shape[0], -1))
+
+    def _onnx_mapping(self, z: torch.Tensor) -> torch.Tensor:
+        c = self._label.expand(z.shape[0], -1)
+        return torch.from_numpy(self._onnx.mapping(z.numpy(), c.numpy()))
+
+    def _onnx_synthesis(
+            self, ws: torch.Tensor, transform: torch.Tensor
+        ) -> torch.Tensor:
+        return torch.from_numpy(
+            self._onnx.synthesis(ws.numpy(), transform.numpy())
+            )
+
+    def _run_batched(self, fn, x: torch.Tensor, *args) -> torch.Tensor:
+        """
+        traced & exported graphs run at a fixed batch size, so x is split into chunks & the last one gets padded.
+        the other arguments are passed to every chunk as is, so they must not have a batch dimension.
+        """
+        outputs = []
+        for start in range(0, x.shape[0], self._batch):
+            chunk = x[start:start + self._batch]
+            size = chunk.shape[0]
+            if size < self._batch:
+                chunk = torch.cat(
+                    [chunk, chunk[-1:].expand(self._batch - size, *chunk.shape[1:])]
+                    )
+            outputs.append(fn(chunk, *args)[:size])
+        return outputs[0] if len(outputs) == 1 else torch.cat(outputs)
+
     def generate(
             self,
             seed: int,  # random seed (same seed will generate same image)
@@ -62,36 +282,97 @@ class ImageGenerator:
             translate: Tuple[float, float] = (0, 0),  # translate XY-coordinate
             rotate: float = 0,  # rotation angle in degrees
         ) -> PIL.Image:
+        return self.generate_batch(
+            [seed],
+            truncation_psi=truncation_psi,
+            noise_mode=noise_mode,
+            translate=translate,
+            rotate=rotate
+            )[0]
+
+    def generate_batch(
+            self,
+            seeds: List[int],  # random seeds (one image per seed)
+            truncation_psi: float = 1,  # truncation psi (weirdness)
+            noise_mode:
+        str = 'const',  # noise mode ('const', 'random' or 'none')
+            translate: Tuple[float, float] = (0, 0),  # translate XY-coordinate
+            rotate: float = 0,  # rotation angle in degrees
+        ) -> List[PIL.Image]:
+        return [
+            PIL.Image.fromarray(img, 'RGB') for img in self._generate(
+                seeds,
+                truncation_psi=truncation_psi,
+                noise_mode=noise_mode,
+                translate=translate,
+                rotate=rotate
+                )
+            ]
+
+    def generate_jpegs(
+            self,
+            seeds: List[int],  # random seeds (one image per seed)
+            truncation_psi: float = 1,  # truncation psi (weirdness)
+            noise_mode:
+        str = 'const',  # noise mode ('const', 'random' or 'none')
+            translate: Tuple[float, float] = (0, 0),  # translate XY-coordinate
+            rotate: float = 0,  # rotation angle in degrees
+        ) -> List[bytes]:
+        """
+        like generate_batch, but returns the selfies encoded as jpeg.
+        """
+        return [
+            encode_jpeg(PIL.Image.fromarray(img, 'RGB')) for img in self._generate(
+                seeds,
+                truncation_psi=truncation_psi,
+                noise_mode=noise_mode,
+                translate=translate,
+                rotate=rotate
+                )
+            ]
+
+    def _generate(
+            self,
+            seeds: List[int],
+            truncation_psi: float,
+            noise_mode: str,
+            translate: Tuple[float, float],
+            rotate: float,
+        ) -> np.ndarray:
+        """
+        returns the uint8 images for the seeds with shape [N, H, W, 3] (without copying them, when on the cpu).
+        """
         # measure time
         start = time.time()
 
-        # generate image
+        # generate images in one forward pass
 
         self._logger.debug(
-            f'generating image for seed {seed} with "{self._network}"... ',
+            f'generating images for seeds {seeds} with "{self._network}"... ',
             )
-        z = torch.from_numpy(
-            np.random.RandomState(seed).randn(1, self._G.z_dim)
-            ).to(self._device)
-
         # construct an inverse rotation/translation matrix and pass to the generator.  The
         # generator expects this matrix as an inverse to avoid potentially failing numerical
         # operations in the network.
-        if hasattr(self._G.synthesis, 'input'):
-            m = make_transform(translate, rotate)
-            m = np.linalg.inv(m)
-            self._G.synthesis.input.transform.copy_(torch.from_numpy(m))
+        m = make_transform(translate, rotate)
+        m = np.linalg.inv(m)
+        transform = torch.from_numpy(m).float().to(self._device)
 
-        img = self._G(
-            z,
-            self._label,
-            truncation_psi=truncation_psi,
-            noise_mode=noise_mode
-            )
-        img = (img.permute(0, 2, 3, 1) * 127.5
-               + 128).clamp(0, 255).to(torch.uint8)
-        pil_img = PIL.Image.fromarray(img[0].cpu().numpy(), 'RGB')
+        # autograd, shape assertions and statistics reporting are skipped while generating
+        with misc.inference_mode():
+            if self._w_bank is not None and all(
+                seed in self._w_bank for seed in seeds
+                ):
+                # feed the synthesis network directly from the bank (skips the mapping network)
+                ws = torch.from_numpy(
+                    np.stack([self._w_bank.get(seed) for seed in seeds])
+                    ).to(self._device)
+            else:
+                ws = self._map(self._seeds_to_z(seeds))
+            if truncation_psi != 1:
+                ws = self._w_avg.lerp(ws, truncation_psi)
+            ws = ws.unsqueeze(1).repeat([1, self._num_ws, 1])
+            img = self._synthesize(ws, transform, noise_mode).cpu().numpy()
 
         self._logger.debug(f'done in {time.time() - start}s')
 
-        return pil_img
\ No newline at end of file
+        return img
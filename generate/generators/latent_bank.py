@@ -0,0 +1,62 @@
+from typing import Dict, Any
+from collections import OrderedDict
+
+import os
+import json
+import numpy as np
+
+
+def get_bank_path(network: str) -> str:
+    """
+    returns the path of the w latent bank belonging to a network .pkl file.
+    """
+    return f'{os.path.splitext(network)[0]}_wbank.npy'
+
+
+def get_meta_path(bank: str) -> str:
+    """
+    returns the path of the metadata file belonging to a w latent bank.
+    """
+    return f'{os.path.splitext(bank)[0]}.json'
+
+
+class LatentBank:
+    """
+    memory-mapped bank of precomputed (untruncated) w latents for a consecutive range of seeds.
+    the bank is opened read-only, so several processes share the same pages. recently used
+    latents are kept in a small lru cache in front of the memory map.
+    """
+    def __init__(
+            self,
+            path: str,  # path to the .npy bank
+            cache_size: int = 256  # how many latents to keep in the lru cache
+        ) -> None:
+
+        with open(get_meta_path(path)) as file:
+            meta: Dict[str, Any] = json.load(file)
+
+        self._ws = np.load(path, mmap_mode='r')
+        self._cache: OrderedDict[int, np.ndarray] = OrderedDict()
+        self._cache_size = cache_size
+
+        self.seed_start: int = meta['seed_start']
+        self.num_seeds: int = self._ws.shape[0]
+        self.network: str = meta['network']
+        self.model_hash: str = meta.get('model_hash')  # content hash of the network it was made with
+
+    def __contains__(self, seed: int) -> bool:
+        return self.seed_start <= seed < self.seed_start + self.num_seeds
+
+    def get(self, seed: int) -> np.ndarray:
+        w = self._cache.get(seed)
+        if w is not None:
+            self._cache.move_to_end(seed)
+            return w
+
+        # copy the latent out of the memory map & evict the least recently used one
+        w = np.array(self._ws[seed - self.seed_start], dtype=np.float32)
+        self._cache[seed] = w
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+        return w
@@ -0,0 +1,182 @@
+from typing import Dict, Any, Tuple
+
+import os
+import json
+import inspect
+import numpy as np
+import torch
+
+from generators.traced_generator import TraceableGenerator, get_model_hash
+
+# onnx opset the generators are exported with
+OPSET = 13
+
+
+def get_onnx_paths(network: str) -> Tuple[str, str]:
+    """
+    returns the paths of the exported mapping & synthesis networks belonging to a network .pkl file.
+    """
+    stem = os.path.splitext(network)[0]
+    return f'{stem}_mapping.onnx', f'{stem}_synthesis.onnx'
+
+
+def get_meta_path(network: str) -> str:
+    """
+    returns the path of the metadata file belonging to the exported networks.
+    """
+    return f'{os.path.splitext(network)[0]}_onnx.json'
+
+
+def is_exported(network: str) -> bool:
+    """
+    returns True, if the network was exported & the .pkl did not change since then.
+    """
+    if not all(
+            os.path.isfile(path)
+            for path in [*get_onnx_paths(network), get_meta_path(network)]
+        ):
+        return False
+    with open(get_meta_path(network)) as file:
+        return json.load(file).get('model_hash') == get_model_hash(network)
+
+
+class _Mapping(torch.nn.Module):
+    def __init__(self, module: TraceableGenerator) -> None:
+        super().__init__()
+        self.module = module
+
+    def forward(self, z: torch.Tensor, c: torch.Tensor) -> torch.Tensor:
+        return self.module.mapping(z, c)
+
+
+def _affine_grid_generator(g, theta, size, align_corners):
+    """
+    onnx has no affine_grid before opset 20. the grid size is static, so the homogeneous base
+    grid becomes a constant & the grid is a single matmul with theta.
+    """
+    from torch.onnx.symbolic_helper import _get_const
+
+    n, _, h, w = _get_const(size, 'is', 'size')
+    align_corners = _get_const(align_corners, 'b', 'align_corners')
+
+    def coords(steps):
+        c = torch.linspace(-1, 1, steps)
+        return c if align_corners else c * (steps - 1) / steps
+
+    base = torch.ones([h, w, 3])
+    base[:, :, 0] = coords(w).unsqueeze(0)
+    base[:, :, 1] = coords(h).unsqueeze(1)
+    base = g.op('Constant', value_t=base.reshape([1, h * w, 3]))
+    grid = g.op('MatMul', base, g.op('Transpose', theta, perm_i=[0, 2, 1]))
+    return g.op(
+        'Reshape',
+        grid,
+        g.op('Constant', value_t=torch.tensor([n, h, w, 2], dtype=torch.int64))
+        )
+
+
+def export_onnx(
+        G: torch.nn.Module,  # G_ema on the cpu
+        network: str,  # network .pkl filename the exports belong to
+        batch_size: int,  # batch size the exports run at
+        noise_mode: str = 'const'
+    ) -> None:
+    """
+    exports the mapping & synthesis networks of G_ema to onnx. the synthesis network takes the inverse
+    rotation/translation matrix as an explicit input & returns uint8 images with shape [N, H, W, 3].
+    the native cpu plugins are skipped while exporting, so only standard torch ops end up in the graphs.
+    """
+    torch.onnx.register_custom_op_symbolic(
+        '::affine_grid_generator', _affine_grid_generator, OPSET
+        )
+
+    module = TraceableGenerator(G, noise_mode).eval().requires_grad_(False)
+    z = torch.randn([batch_size, G.z_dim])
+    c = torch.zeros([batch_size, G.c_dim])
+    ws = torch.randn([batch_size, G.mapping.num_ws, G.w_dim])
+    transform = torch.eye(3)
+    mapping_path, synthesis_path = get_onnx_paths(network)
+    # the custom symbolic above needs the torchscript exporter (newer torch versions default to dynamo)
+    options = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+
+    # write to temporary files first, so a starting generator never sees a half written export
+    with torch.no_grad():
+        torch.onnx.export(
+            _Mapping(module),
+            (z, c),
+            f'{mapping_path}.tmp',
+            input_names=['z', 'c'],
+            output_names=['w'],
+            opset_version=OPSET,
+            **options
+            )
+        torch.onnx.export(
+            module, (ws, transform),
+            f'{synthesis_path}.tmp',
+            input_names=['ws', 'transform'],
+            output_names=['img'],
+            opset_version=OPSET,
+            **options
+            )
+    os.replace(f'{mapping_path}.tmp', mapping_path)
+    os.replace(f'{synthesis_path}.tmp', synthesis_path)
+
+    meta = {
+        'z_dim': G.z_dim,
+        'c_dim': G.c_dim,
+        'w_dim': G.w_dim,
+        'num_ws': G.mapping.num_ws,
+        'batch_size': batch_size,
+        'noise_mode': noise_mode,
+        'w_avg': G.mapping.w_avg.tolist(),
+        'network': os.path.basename(network),
+        'model_hash': get_model_hash(network)
+        }
+    meta_path = get_meta_path(network)
+    with open(f'{meta_path}.tmp', 'w') as file:
+        json.dump(meta, file)
+    os.replace(f'{meta_path}.tmp', meta_path)
+
+
+class OnnxGenerator:
+    """
+    runs the exported mapping & synthesis networks with onnx runtime's cpu provider.
+    """
+    def __init__(
+            self,
+            network: str,  # network .pkl filename the exports belong to
+            threads: int = 0  # intra-op threads (0 lets onnx runtime decide)
+        ) -> None:
+        import onnxruntime as ort
+
+        with open(get_meta_path(network)) as file:
+            self.meta: Dict[str, Any] = json.load(file)
+        self.w_avg = np.array(self.meta['w_avg'], dtype=np.float32)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        mapping_path, synthesis_path = get_onnx_paths(network)
+        self._mapping = ort.InferenceSession(
+            mapping_path, options, providers=['CPUExecutionProvider']
+            )
+        self._synthesis = ort.InferenceSession(
+            synthesis_path, options, providers=['CPUExecutionProvider']
+            )
+
+    @staticmethod
+    def _run(session, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        # the exporter drops unused inputs (the labels of unconditional networks, the transform of networks without an input layer)
+        names = {i.name for i in session.get_inputs()}
+        return session.run(
+            None, {
+                name: value.astype(np.float32)
+                for name, value in inputs.items() if name in names
+                }
+            )[0]
+
+    def mapping(self, z: np.ndarray, c: np.ndarray) -> np.ndarray:
+        return self._run(self._mapping, {'z': z, 'c': c})
+
+    def synthesis(self, ws: np.ndarray, transform: np.ndarray) -> np.ndarray:
+        return self._run(self._synthesis, {'ws': ws, 'transform': transform})
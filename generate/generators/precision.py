@@ -0,0 +1,71 @@
+import torch
+
+from torch_utils import import_hooks
+from torch_utils.ops import bias_act
+
+# precisions the eager generator can run with
+PRECISIONS = ['fp32', 'bf16', 'int8']
+
+
+def enable_bf16(G: torch.nn.Module) -> int:
+    """
+    runs the synthesis layers of a generator in bfloat16, except for the last one, which makes the
+    rgb image. the mapping network & the fourier features stay in float32. the network has to be
+    unpickled with the stylegan3_layer_dtype patch of torch_utils.import_hooks, since the layers
+    pick their dtype themselves otherwise. other generators are not affected. returns the number
+    of bfloat16 layers (0, if the network code could not be patched).
+    """
+    layers = [
+        module for module in G.modules()
+        if type(module).__name__ == 'SynthesisLayer' and not module.is_torgb
+        ]
+    if not all(
+            import_hooks.is_applied(layer, 'stylegan3_layer_dtype')
+            for layer in layers
+        ):
+        return 0
+    for layer in layers:
+        layer.compute_dtype = torch.bfloat16
+    return len(layers)
+
+
+class _Int8Linear(torch.nn.Module):
+    """
+    stand-in for a stylegan3 FullyConnectedLayer with the gains folded into the weights. the linear
+    layer inside gets replaced by its dynamically quantized int8 version.
+    """
+    def __init__(self, layer: torch.nn.Module) -> None:
+        super().__init__()
+        self.activation = layer.activation
+        self.linear = torch.nn.Linear(
+            layer.in_features, layer.out_features, bias=layer.bias is not None
+            )
+        with torch.no_grad():
+            self.linear.weight.copy_(layer.weight * layer.weight_gain)
+            if layer.bias is not None:
+                self.linear.bias.copy_(layer.bias * layer.bias_gain)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        x = self.linear(x.float())
+        if self.activation != 'linear':
+            x = bias_act.bias_act(x, act=self.activation)
+        return x
+
+
+def quantize_int8(G: torch.nn.Module) -> int:
+    """
+    dynamically quantizes the fully connected layers (mapping network & style affines) of a
+    generator to int8 in-place. the modulated convolutions get new weights for every sample,
+    so they stay in floating point. returns the number of quantized layers.
+    """
+    layers = [
+        (name, module) for name, module in G.named_modules()
+        if type(module).__name__ == 'FullyConnectedLayer'
+        ]
+    for name, module in layers:
+        parent_name, _, attr = name.rpartition('.')
+        setattr(G.get_submodule(parent_name), attr, _Int8Linear(module))
+    torch.quantization.quantize_dynamic(
+        G, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    return len(layers)
@@ -0,0 +1,99 @@
+from typing import Optional, Dict, Any
+
+import os
+import json
+import multiprocessing
+
+
+class SelfiePool:
+    """
+    persistent ring buffer of encoded jpeg selfies for one role. the slots are files in
+    '{pool_dir}/{role}/' and a small index file keeps track of head & count, so the pool
+    survives restarts of generate.py. the lock is shared with the image process, when the
+    pool is passed to it.
+    """
+    def __init__(
+            self,
+            pool_dir: str,  # directory holding the pools of all roles
+            role: str,
+            capacity: int  # how many selfies the pool holds
+        ) -> None:
+
+        self._dir = os.path.join(pool_dir, role)
+        self._index_path = os.path.join(self._dir, 'index.json')
+        self._capacity = capacity
+        self._lock = multiprocessing.Lock()
+
+        os.makedirs(self._dir, exist_ok=True)
+
+        # start empty, if there is no index yet or the capacity changed
+        with self._lock:
+            index = self._read_index()
+            if index is None or index['capacity'] != capacity:
+                self._write_index({
+                    'capacity': capacity,
+                    'head': 0,
+                    'count': 0,
+                    'seeds': [None] * capacity
+                    })
+
+    def _slot_path(self, slot: int) -> str:
+        return os.path.join(self._dir, f'slot_{str(slot).zfill(4)}.jpg')
+
+    def _read_index(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._index_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_index(self, index: Dict[str, Any]) -> None:
+        # write atomically, so a crash never leaves a broken index behind
+        with open(f'{self._index_path}.tmp', 'w') as file:
+            json.dump(index, file)
+        os.replace(f'{self._index_path}.tmp', self._index_path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._read_index()['count']
+
+    def full(self) -> bool:
+        return len(self) >= self._capacity
+
+    def put(self, image_data: bytes, seed: int) -> bool:
+        """
+        appends an encoded selfie. returns False, if the pool is full.
+        """
+        with self._lock:
+            index = self._read_index()
+            if index['count'] >= self._capacity:
+                return False
+
+            slot = (index['head'] + index['count']) % self._capacity
+            with open(f'{self._slot_path(slot)}.tmp', 'wb') as file:
+                file.write(image_data)
+            os.replace(f'{self._slot_path(slot)}.tmp', self._slot_path(slot))
+
+            index['seeds'][slot] = seed
+            index['count'] += 1
+            self._write_index(index)
+        return True
+
+    def get(self) -> Optional[bytes]:
+        """
+        removes and returns the oldest encoded selfie or None, if the pool is empty.
+        """
+        with self._lock:
+            index = self._read_index()
+            if index['count'] <= 0:
+                return None
+
+            slot = index['head']
+            with open(self._slot_path(slot), 'rb') as file:
+                image_data = file.read()
+
+            index['seeds'][slot] = None
+            index['head'] = (slot + 1) % self._capacity
+            index['count'] -= 1
+            self._write_index(index)
+        return image_data
@@ -0,0 +1,159 @@
+from typing import Optional, Tuple
+
+import struct
+import multiprocessing
+from multiprocessing import shared_memory
+
+# ring header: read offset, write offset, used bytes (incl. slot headers & wrap-around waste), count,
+# total number of selfies taken out
+_RING_HEADER = struct.Struct('<QQQQQ')
+# slot header: payload size, flags, seed
+_SLOT_HEADER = struct.Struct('<IIq')
+
+_READY = 1  # the payload is completely written
+_WRAP = 2  # the rest of the buffer is unused, the next slot starts at offset 0
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+class SelfieRing:
+    """
+    ring buffer of encoded jpeg selfies for one role in shared memory. the image process writes
+    each selfie once into a slot & the main loop reads it from there, so nothing is pickled or
+    sent through a pipe. slots have a header with the payload size, a ready flag and the seed.
+    the capacity is given in bytes, so the memory stays bounded regardless of the image size.
+    the shared memory & the lock are handed to the image process, when the ring is passed to it.
+    """
+    def __init__(
+            self,
+            capacity: int,  # size of the slot area in bytes
+            consumed: multiprocessing.Event = None  # optional event that is set, whenever a selfie is taken out
+        ) -> None:
+
+        self._capacity = _align(capacity)
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=_RING_HEADER.size + self._capacity
+            )
+        self._lock = multiprocessing.Lock()
+        self._consumed = consumed
+        _RING_HEADER.pack_into(self._shm.buf, 0, 0, 0, 0, 0, 0)
+
+    def _read_header(self) -> Tuple[int, int, int, int, int]:
+        return _RING_HEADER.unpack_from(self._shm.buf, 0)
+
+    def _write_header(
+            self, read_pos: int, write_pos: int, used: int, count: int,
+            taken: int
+        ) -> None:
+        _RING_HEADER.pack_into(
+            self._shm.buf, 0, read_pos, write_pos, used, count, taken
+            )
+
+    def _slot_offset(self, pos: int) -> int:
+        return _RING_HEADER.size + pos
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._read_header()[3]
+
+    def taken(self) -> int:
+        """
+        returns how many selfies were taken out of the ring so far.
+        """
+        with self._lock:
+            return self._read_header()[4]
+
+    def free(self) -> int:
+        """
+        returns how many payload bytes still fit into the ring (ignoring the wrap-around).
+        """
+        with self._lock:
+            used = self._read_header()[2]
+        return max(self._capacity - used - _SLOT_HEADER.size, 0)
+
+    def put(self, image_data: bytes, seed: int) -> bool:
+        """
+        appends an encoded selfie. returns False, if the ring is full.
+        """
+        size = len(image_data)
+        need = _SLOT_HEADER.size + _align(size)
+        if need > self._capacity:
+            raise ValueError(
+                f'selfie of {size} bytes does not fit into a ring of {self._capacity} bytes'
+                )
+
+        # reserve the slot
+        with self._lock:
+            read_pos, write_pos, used, count, taken = self._read_header()
+            waste = 0
+            if write_pos + need > self._capacity:
+                waste = self._capacity - write_pos
+            if used + waste + need > self._capacity:
+                return False
+            if waste:
+                if waste >= _SLOT_HEADER.size:
+                    _SLOT_HEADER.pack_into(
+                        self._shm.buf, self._slot_offset(write_pos), 0, _WRAP, 0
+                        )
+                write_pos = 0
+            pos = write_pos
+            _SLOT_HEADER.pack_into(
+                self._shm.buf, self._slot_offset(pos), size, 0, seed
+                )
+            self._write_header(
+                read_pos, (pos + need) % self._capacity, used + waste + need,
+                count + 1, taken
+                )
+
+        # copy the payload outside of the lock & mark the slot as ready afterwards
+        start = self._slot_offset(pos) + _SLOT_HEADER.size
+        self._shm.buf[start:start + size] = image_data
+        _SLOT_HEADER.pack_into(
+            self._shm.buf, self._slot_offset(pos), size, _READY, seed
+            )
+        return True
+
+    def get(self) -> Optional[Tuple[int, bytes]]:
+        """
+        removes and returns the seed & the oldest encoded selfie or None, if the ring is empty.
+        """
+        with self._lock:
+            read_pos, write_pos, used, count, taken = self._read_header()
+            if count <= 0:
+                return None
+
+            # skip the unused rest of the buffer
+            rest = self._capacity - read_pos
+            if rest < _SLOT_HEADER.size or _SLOT_HEADER.unpack_from(
+                self._shm.buf, self._slot_offset(read_pos)
+                )[1] & _WRAP:
+                used -= rest
+                read_pos = 0
+
+            size, flags, seed = _SLOT_HEADER.unpack_from(
+                self._shm.buf, self._slot_offset(read_pos)
+                )
+            if not flags & _READY:
+                return None  # still being written
+
+            start = self._slot_offset(read_pos) + _SLOT_HEADER.size
+            image_data = bytes(self._shm.buf[start:start + size])
+            need = _SLOT_HEADER.size + _align(size)
+            self._write_header(
+                (read_pos + need) % self._capacity, write_pos, used - need,
+                count - 1, taken + 1
+                )
+        if self._consumed is not None:
+            self._consumed.set()
+        return seed, image_data
+
+    def close(self) -> None:
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """
+        frees the shared memory. must be called once by the process that created the ring.
+        """
+        self._shm.unlink()
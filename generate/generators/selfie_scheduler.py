@@ -0,0 +1,86 @@
+from typing import Optional, List, Dict, Set
+
+import math
+
+
+class SelfieScheduler:
+    """
+    decides which role gets the next batch of selfies. every role keeps a prefetch depth that
+    covers its observed [image] rate for as long as a round of batches over all roles takes, and
+    the role with the lowest buffer relative to its depth goes first.
+    """
+    def __init__(
+            self,
+            roles: List[str],
+            batch_size: int,  # selfies per batch
+            min_depth: int = 3,  # prefetch depth of roles that have not sent a selfie yet
+            smoothing: float = 0.2,  # weight of the newest observation in the moving averages
+            window: float = 5.0  # seconds the consumption is counted before the rate gets updated
+        ) -> None:
+
+        self._batch_size = batch_size
+        self._min_depth = min_depth
+        self._smoothing = smoothing
+        self._window = window
+
+        self._rate: Dict[str, float] = {role: 0.0 for role in roles}  # selfies per second
+        self._batch_time: Dict[str, float] = {role: 0.0 for role in roles}  # seconds per batch
+        self._taken: Dict[str, Optional[int]] = {role: None for role in roles}
+        self._since: Dict[str, float] = {role: 0.0 for role in roles}
+
+    def _average(self, old: float, new: float) -> float:
+        return self._smoothing * new + (1 - self._smoothing) * old
+
+    def observe_taken(self, role: str, taken: int, now: float) -> None:
+        """
+        updates the [image] rate of a role from the total number of selfies taken from its buffer.
+        """
+        if self._taken[role] is None:
+            self._taken[role] = taken
+            self._since[role] = now
+            return
+
+        elapsed = now - self._since[role]
+        if elapsed >= self._window:
+            self._rate[role] = self._average(
+                self._rate[role], (taken - self._taken[role]) / elapsed
+                )
+            self._taken[role] = taken
+            self._since[role] = now
+
+    def observe_batch(self, role: str, seconds: float) -> None:
+        """
+        updates how long a batch of a role takes to generate.
+        """
+        if self._batch_time[role]:
+            self._batch_time[role] = self._average(self._batch_time[role], seconds)
+        else:
+            self._batch_time[role] = seconds
+
+    def depth(self, role: str) -> int:
+        """
+        returns how many selfies of a role should be buffered.
+        """
+        lead_time = sum(self._batch_time.values())
+        return max(
+            self._min_depth,
+            math.ceil(self._rate[role] * lead_time) + self._batch_size
+            )
+
+    def next_role(
+            self,
+            buffered: Dict[str, int],  # selfies in the buffer of each role
+            blocked: Optional[Set[str]] = None  # roles that have no room for another batch
+        ) -> Optional[str]:
+        """
+        returns the role with the lowest buffer relative to its prefetch depth or None, if all are stocked up.
+        """
+        blocked = blocked or set()
+        fill = {
+            role: count / self.depth(role)
+            for role, count in buffered.items()
+            if role not in blocked and count < self.depth(role)
+            }
+        if not fill:
+            return None
+        return min(fill, key=fill.get)
@@ -0,0 +1,55 @@
+from typing import Dict, Tuple
+
+import hashlib
+import torch
+
+from torch_utils import misc
+
+# tensors that get written in-place while generating & can't be shared
+_MUTABLE = ('synthesis.input.transform', )
+
+
+def _tensor_key(tensor: torch.Tensor) -> Tuple:
+    data = tensor.detach().cpu().contiguous().numpy().tobytes()
+    return (
+        str(tensor.dtype), tuple(tensor.shape), str(tensor.device),
+        isinstance(tensor, torch.nn.Parameter),
+        hashlib.sha256(data).hexdigest()
+        )
+
+
+class TensorStore:
+    """
+    shares identical parameters & buffers between networks. the role networks are fine-tuned from
+    the same base network, so frozen layers, filters & other unchanged tensors only have to be kept
+    in memory once per process.
+    """
+    def __init__(self) -> None:
+        self._tensors: Dict[Tuple, torch.Tensor] = {}
+        self.bytes_total = 0
+        self.bytes_saved = 0
+
+    def share(self, module: torch.nn.Module) -> int:
+        """
+        replaces the tensors of a module with identical tensors of the modules shared before.
+        returns the number of bytes saved.
+        """
+        saved = 0
+        for name, tensor in misc.named_params_and_buffers(module):
+            size = tensor.numel() * tensor.element_size()
+            self.bytes_total += size
+            if name in _MUTABLE:
+                continue
+            key = _tensor_key(tensor)
+            shared = self._tensors.setdefault(key, tensor)
+            if shared is tensor or not torch.equal(shared, tensor):
+                continue
+            owner_name, _, attr = name.rpartition('.')
+            owner = module.get_submodule(owner_name)
+            if isinstance(tensor, torch.nn.Parameter):
+                owner._parameters[attr] = shared  # pylint: disable=protected-access
+            else:
+                owner._buffers[attr] = shared  # pylint: disable=protected-access
+            saved += size
+        self.bytes_saved += saved
+        return saved
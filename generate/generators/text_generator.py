@@ -1,19 +1,125 @@
+from typing import Optional, List, Tuple, Dict, Pattern
+
+import os
+import math
 import time
+import json
 import torch
 import random
+import hashlib
+import numpy as np
+from collections import deque
 from logging import Logger
 from aitextgen import aitextgen
+from transformers import LogitsProcessorList, TemperatureLogitsWarper, TopKLogitsWarper, TopPLogitsWarper
+
+import dnnlib
+
+# past key/values of a gpt-2/gpt-2neo model: ((key, value), ...) with shape [batch, heads, tokens, head_dim]
+Past = Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+
+
+def _slice_past(past: Past, tokens: int = None, row: int = None) -> Past:
+    """
+    returns the past key/values of the first tokens and/or of a single sequence of the batch.
+    """
+    return tuple(
+        tuple(
+            t[row:row + 1 if row is not None else None, :, :tokens]
+            for t in layer
+            ) for layer in past
+        )
+
+
+def _expand_past(past: Past, n: int) -> Past:
+    return tuple(tuple(t.expand(n, -1, -1, -1) for t in layer) for layer in past)
+
+
+def get_model_dir_hash(model: str) -> str:
+    """
+    returns a hash of a model folder (names, sizes & modification times of its files) or of a model name.
+    """
+    if os.path.isdir(model):
+        model = os.path.realpath(model)  # the same folder by any relative path or symlink
+    sha = hashlib.sha256(model.encode())
+    if os.path.isdir(model):
+        for name in sorted(os.listdir(model)):
+            stat = os.stat(os.path.join(model, name))
+            sha.update(f'{name}:{stat.st_size}:{stat.st_mtime}'.encode())
+    return sha.hexdigest()[:16]
+
+
+def get_prompt_cache_dir(model: str) -> str:
+    """
+    returns the directory of the stored prompt past key/values of a model (see make_prompt_cache.py).
+    """
+    return dnnlib.util.make_cache_dir_path('prompt_cache', get_model_dir_hash(model))
+
+
+def _ids_hash(ids: List[int]) -> str:
+    return hashlib.sha256(np.asarray(ids, dtype=np.int64).tobytes()).hexdigest()[:16]
+
+
+class _OpeningConstraint:
+    """
+    only lets the given openings (e.g. the role markers) or the end of the text be sampled at the
+    start of a line. the state of a sequence is the part of the opening sampled so far or None,
+    when the sequence is not at the start of a line.
+    """
+    def __init__(self, tokenizer, openings: List[str]) -> None:
+        allowed: Dict[Tuple[int, ...], set] = {(): {tokenizer.eos_token_id}}
+        self._complete = set()
+        for opening in openings:
+            # the trailing space belongs to the next word in gpt-2's vocabulary
+            ids = tuple(tokenizer.encode(opening.rstrip()))
+            for i in range(len(ids)):
+                allowed.setdefault(ids[:i], set()).add(ids[i])
+            self._complete.add(ids)
+        self._allowed = {state: sorted(ids) for state, ids in allowed.items()}
+        # byte-level bpe tokens ending with a newline ('Ċ')
+        self._newlines = {
+            index for token, index in tokenizer.get_vocab().items()
+            if token.endswith('\u010a')
+            }
+
+    def start(self, ids: List[int]) -> Optional[Tuple[int, ...]]:
+        return () if ids[-1] in self._newlines else None
+
+    def mask(
+            self, logits: torch.Tensor, states: List[Optional[Tuple[int, ...]]]
+        ) -> torch.Tensor:
+        if all(state is None for state in states):
+            return logits
+        bias = torch.zeros_like(logits)
+        for i, state in enumerate(states):
+            if state is not None:
+                bias[i].fill_(-float('inf'))
+                bias[i, self._allowed[state]] = 0
+        return logits + bias
+
+    def advance(
+            self, state: Optional[Tuple[int, ...]], token: int
+        ) -> Optional[Tuple[int, ...]]:
+        if state is None:
+            return () if token in self._newlines else None
+        state = state + (token, )
+        # done with the opening (or the sequence ended)
+        return None if state in self._complete or state not in self._allowed else state
 
 
 class TextGenerator:
     """
     generates text from prompts with a gpt-2/gpt-2neo model and returns them as a string.
+    the token ids & past key/values of the last generation are kept, so the part of the next
+    prompt that was already seen (e.g. the previous prompt & the message generated from it)
+    doesn't get encoded again.
     """
     def __init__(
             self,
             logger: Logger,
             model: str = None,
-            model_folder: str = None
+            model_folder: str = None,
+            prompt_cache: bool = False  # warm start from the stored prompts (see make_prompt_cache.py)
         ) -> None:
 
         self._logger = logger
@@ -27,13 +133,142 @@ class TextGenerator:
         self._gpt2 = aitextgen(
             model=model, model_folder=model_folder, to_gpu=cuda_avail
             )
+        self._gpt2.model.eval()
+        self._device = next(self._gpt2.model.parameters()).device
+        config = self._gpt2.model.config
+        self._max_positions: int = getattr(
+            config, 'n_positions', None
+            ) or config.max_position_embeddings
+        self._eos: int = self._gpt2.tokenizer.eos_token_id
 
         self._model = model if model else model_folder
 
+        # live conversation cache: token ids & their past key/values
+        self._cache_ids: List[int] = []
+        self._cache_past: Optional[Past] = None
+
+        # token lengths of the last complete messages
+        self._message_lengths = deque(maxlen=256)
+
+        # constraint for the line openings (see constrain())
+        self._constraint: Optional[_OpeningConstraint] = None
+
+        # stored prompts: token ids -> key of their past key/values
+        self._prompt_dir = get_prompt_cache_dir(self._model)
+        self._prompts: Dict[Tuple[int, ...], str] = {}
+        if prompt_cache:
+            index = self._read_prompt_index()
+            self._prompts = {tuple(ids): key for key, ids in index.items()}
+            self._logger.info(
+                f'using {len(self._prompts)} stored prompts from "{self._prompt_dir}"'
+                )
+        self._prompt_lengths = sorted(
+            {len(ids) for ids in self._prompts}, reverse=True
+            )
+
+    def _read_prompt_index(self) -> Dict[str, List[int]]:
+        path = os.path.join(self._prompt_dir, 'index.json')
+        if not os.path.isfile(path):
+            return {}
+        with open(path) as file:
+            return json.load(file)
+
+    def save_prompt_cache(self, prompts: List[str]) -> int:
+        """
+        stores the past key/values of the prompts (as they start a run), so the generator can warm start
+        from them. returns the number of stored prompts.
+        """
+        os.makedirs(self._prompt_dir, exist_ok=True)
+        index = self._read_prompt_index()
+        with torch.inference_mode():
+            for prompt in prompts:
+                ids = self._gpt2.tokenizer.encode(prompt.strip() + '\n')
+                key = _ids_hash(ids)
+                if key in index:
+                    continue
+                past = self._gpt2.model(
+                    input_ids=torch.tensor([ids], device=self._device),
+                    use_cache=True
+                    ).past_key_values
+                # [layers, key/value, heads, tokens, head_dim]
+                array = torch.stack([
+                    torch.stack([key_states[0], value_states[0]])
+                    for key_states, value_states in past
+                    ]).cpu().numpy()
+                path = os.path.join(self._prompt_dir, f'{key}.npy')
+                with open(f'{path}.tmp', 'wb') as file:
+                    np.save(file, array)
+                os.replace(f'{path}.tmp', path)
+                index[key] = ids
+
+        path = os.path.join(self._prompt_dir, 'index.json')
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(index, file)
+        os.replace(f'{path}.tmp', path)
+        return len(index)
+
+    def _load_prompt(self, key: str) -> Past:
+        array = np.load(
+            os.path.join(self._prompt_dir, f'{key}.npy'), mmap_mode='c'
+            )
+        tensor = torch.from_numpy(array).to(self._device)
+        return tuple(
+            (tensor[layer, 0][None], tensor[layer, 1][None])
+            for layer in range(tensor.shape[0])
+            )
+
+    def constrain(self, openings: Optional[List[str]]) -> None:
+        """
+        from now on, only lets the given openings be sampled at the start of a line (None removes the constraint).
+        """
+        self._constraint = _OpeningConstraint(
+            self._gpt2.tokenizer, openings
+            ) if openings else None
+
+    def reset(self) -> None:
+        """
+        drops the cached conversation (e.g. when a new run starts).
+        """
+        self._cache_ids = []
+        self._cache_past = None
+
+    def _prefill(self, ids: List[int]) -> Tuple[torch.Tensor, Past]:
+        """
+        runs the model over the prompt ids, starting from the longest cached prefix. returns the
+        logits of the last token & the past key/values of all prompt tokens.
+        """
+        reuse = 0
+        for cached, new in zip(self._cache_ids, ids):
+            if cached != new:
+                break
+            reuse += 1
+        past = self._cache_past
+
+        # warm start from the longest stored prompt, if it covers more than the cached conversation
+        for length in self._prompt_lengths:
+            if length <= reuse:
+                break
+            key = self._prompts.get(tuple(ids[:length]))
+            if key is not None:
+                self._logger.debug(f'warm start from stored prompt {key}')
+                reuse, past = length, self._load_prompt(key)
+                break
+
+        reuse = min(reuse, len(ids) - 1)  # the last token is always run to get its logits
+        past = _slice_past(past, tokens=reuse) if reuse else None
+        input_ids = torch.tensor([ids[reuse:]], device=self._device)
+        output = self._gpt2.model(
+            input_ids=input_ids, past_key_values=past, use_cache=True
+            )
+        self._logger.debug(
+            f'reused {reuse} of {len(ids)} prompt tokens from the cache'
+            )
+        return output.logits[:, -1, :], output.past_key_values
+
     def generate(
         self,
         prompt: str,
-        max_length: int,
+        max_length: int,  # maximum number of tokens including the prompt
         seed: int = None,
         temperature: float = 0.7,  # controls the "craziness" of the text
         top_k:
@@ -41,7 +276,41 @@ class TextGenerator:
         top_p:
         float = 0.7,  # if nonzero, limits the sampled tokens to the cumulative probability
         n: int = 1
-        ):
+        ) -> str:
+        """
+        returns the prompt & one of n sampled continuations.
+        """
+        return prompt + self.generate_candidates(
+            prompt,
+            max_length,
+            seed=seed,
+            temperature=temperature,
+            top_k=top_k,
+            top_p=top_p,
+            n=n
+            )[0]
+
+    def generate_candidates(
+        self,
+        prompt: str,
+        max_length: int,  # maximum number of tokens including the prompt
+        seed: int = None,
+        temperature: float = 0.7,  # controls the "craziness" of the text
+        top_k:
+        float = 0,  # if nonzero, limits the sampled tokens to the top k values
+        top_p:
+        float = 0.7,  # if nonzero, limits the sampled tokens to the cumulative probability
+        n: int = 1,
+        stop_pattern: Pattern = None,  # role marker that starts a message
+        stop_messages:
+        int = 0,  # if nonzero, a sequence stops once it contains this many complete messages
+        length_percentile:
+        float = 0  # if nonzero, limits max_length to stop_messages times this percentile of the observed message lengths
+        ) -> List[str]:
+        """
+        returns n sampled continuations of the prompt (without the prompt). the first one is picked
+        at random & is the one whose tokens are cached for the next prompt.
+        """
 
         self._logger.debug(
             f'generating message for seed {seed} with "{self._model}"... ',
@@ -49,24 +318,107 @@ class TextGenerator:
 
         start = time.time()
 
+        if seed is not None:
+            torch.manual_seed(seed)
+
+        warpers = LogitsProcessorList()
+        if temperature != 1.0:
+            warpers.append(TemperatureLogitsWarper(temperature))
+        if top_k:
+            warpers.append(TopKLogitsWarper(top_k=int(top_k)))
+        if top_p < 1.0:
+            warpers.append(TopPLogitsWarper(top_p=top_p))
+
+        ids = self._gpt2.tokenizer.encode(prompt)
+        if not ids:
+            ids = [self._eos]
+        max_length = min(max_length, self._max_positions)
+        stopping = stop_pattern is not None and stop_messages > 0
+        if stopping and length_percentile and len(self._message_lengths) >= 16:
+            # leave room for the role marker of the message after the last one
+            new_tokens = math.ceil(
+                stop_messages
+                * np.percentile(self._message_lengths, length_percentile)
+                ) + 8
+            max_length = min(max_length, len(ids) + new_tokens)
+
+        with torch.inference_mode():
+            logits, past = self._prefill(ids)
+
+            # sample n sequences from the same prompt
+            logits = logits.expand(n, -1)
+            past = _expand_past(past, n)
+            tokens = torch.tensor([ids] * n, device=self._device)
+            finished = torch.zeros(n, dtype=torch.bool, device=self._device)
+            texts = [''] * n
+            constraint = self._constraint
+            states = [constraint.start(ids) if constraint else None] * n
+            while tokens.shape[1] < max_length:
+                if constraint:
+                    logits = constraint.mask(logits, states)
+                scores = warpers(tokens, logits.float())
+                next_tokens = torch.multinomial(
+                    torch.softmax(scores, dim=-1), num_samples=1
+                    ).squeeze(1)
+                next_tokens = next_tokens.masked_fill(finished, self._eos)
+                finished |= next_tokens == self._eos
+                if constraint:
+                    states = [
+                        constraint.advance(state, token)
+                        for state, token in zip(states, next_tokens.tolist())
+                        ]
+                if stopping:
+                    # a message is complete, once the role marker of the next one was emitted
+                    for i, token in enumerate(next_tokens.tolist()):
+                        if finished[i]:
+                            continue
+                        texts[i] += self._gpt2.tokenizer.decode([token])
+                        if len(stop_pattern.findall(texts[i])) > stop_messages:
+                            finished[i] = True
+                tokens = torch.cat([tokens, next_tokens[:, None]], dim=1)
+                if finished.all() or tokens.shape[1] >= max_length:
+                    break
+                output = self._gpt2.model(
+                    input_ids=next_tokens[:, None], past_key_values=past,
+                    use_cache=True
+                    )
+                logits, past = output.logits[:, -1, :], output.past_key_values
+
         which_n = 0
         if n > 1:
             which_n = random.randrange(n)
 
-        responses = self._gpt2.generate(
-            prompt=prompt,
-            n=n,
-            return_as_list=True,
-            max_length=max_length,
-            seed=seed,
-            temperature=temperature,
-            top_k=top_k,
-            top_p=top_p,
+        # keep the chosen sequence for the next prompt (all tokens but the last one were run)
+        # copied, so the past of the whole batch is freed instead of being kept alive by a view
+        self._cache_ids = tokens[which_n, :-1].tolist()
+        self._cache_past = tuple(
+            tuple(t.clone() for t in layer) for layer in _slice_past(
+                past, tokens=len(self._cache_ids), row=which_n
+                )
             )
 
-        self._logger.debug(f'done in {time.time() - start}s')
+        rows = tokens[:, len(ids):].tolist()
+        responses = [
+            self._gpt2.tokenizer.decode(
+                [token for token in rows[i] if token != self._eos],
+                skip_special_tokens=True
+                ) for i in [which_n] + [i for i in range(n) if i != which_n]
+            ]
+
+        # observe the lengths of the complete messages
+        if stop_pattern is not None:
+            for response in responses:
+                starts = [match.start() for match in stop_pattern.finditer(response)]
+                for begin, end in zip(starts, starts[1:]):
+                    self._message_lengths.append(
+                        len(self._gpt2.tokenizer.encode(response[begin:end]))
+                        )
+
+        self._logger.debug(
+            f'done in {time.time() - start}s ({tokens.shape[1] - len(ids)} of {max_length - len(ids)} tokens)'
+            )
         self._logger.debug(f'messages:')
         for response in responses:
             self._logger.debug(response)
 
-        return responses[which_n]
\ No newline at end of file
+        return responses
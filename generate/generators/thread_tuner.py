@@ -0,0 +1,158 @@
+from typing import Optional, List, Dict, Any
+
+import os
+import json
+import time
+import socket
+import multiprocessing
+import torch
+
+import dnnlib
+
+# seconds each candidate is measured for
+_DURATION = 3.0
+
+
+def get_cache_path() -> str:
+    """
+    returns the path of the cached tuning result of this host.
+    """
+    name = f'{socket.gethostname()}-{len(_cpus())}cpus-torch{torch.__version__}.json'
+    return dnnlib.util.make_cache_dir_path('thread_tuner', name.replace('+', '-'))
+
+
+def _cpus() -> List[int]:
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def apply_settings(threads: int, interop: int = 0, cpus: Optional[List[int]] = None) -> None:
+    """
+    applies thread settings to the current process. must be called before torch runs any
+    parallel work, since the number of interop threads can only be set once.
+    """
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    if threads:
+        torch.set_num_threads(threads)
+    if interop:
+        try:
+            torch.set_num_interop_threads(interop)
+        except RuntimeError:
+            pass  # interop pool already started
+
+
+def _text_workload(iterations) -> None:
+    # token by token decoding of a gpt-2 sized model: thin matrix products with large weights
+    x = torch.randn(1, 768)
+    weights = [torch.randn(3072, 768), torch.randn(768, 3072)]
+    with torch.inference_mode():
+        for _ in range(iterations):
+            h = torch.nn.functional.gelu(torch.nn.functional.linear(x, weights[0]))
+            torch.nn.functional.linear(h, weights[1])
+
+
+def _image_workload(iterations) -> None:
+    # stylegan3 synthesis layer: batched 3x3 convolution at a low resolution
+    x = torch.randn(4, 256, 36, 36)
+    w = torch.randn(256, 256, 3, 3)
+    with torch.inference_mode():
+        for _ in range(iterations):
+            torch.nn.functional.conv2d(x, w, padding=1)
+
+
+_WORKLOADS = {'text': _text_workload, 'image': _image_workload}
+
+
+def _measure(kind: str, settings: Dict[str, Any], start, results) -> None:
+    apply_settings(**settings)
+    workload = _WORKLOADS[kind]
+    workload(2)  # warm up
+    start.wait()
+    count = 0
+    begin = time.perf_counter()
+    while time.perf_counter() - begin < _DURATION:
+        workload(4)
+        count += 4
+    results[kind] = (time.perf_counter() - begin) / count
+
+
+def _candidates() -> List[Dict[str, Dict[str, Any]]]:
+    cpus = _cpus()
+    count = len(cpus)
+    splits = sorted({max(1, round(count * share)) for share in (0.25, 0.5, 0.75)})
+    candidates = []
+    for text in splits:
+        image = max(1, count - text)
+        for interop in (1, 2):
+            for pin in ([False, True] if hasattr(os, 'sched_setaffinity') and text < count else [False]):
+                candidates.append({
+                    'text': {
+                        'threads': text, 'interop': interop,
+                        'cpus': cpus[:text] if pin else None
+                        },
+                    'image': {
+                        'threads': image, 'interop': interop,
+                        'cpus': cpus[text:] if pin else None
+                        }
+                    })
+    return candidates
+
+
+def _run_candidate(candidate: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+    # fresh processes, so the thread pools of each candidate start from scratch
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Manager() as manager:
+        results = manager.dict()
+        start = ctx.Event()
+        processes = [
+            ctx.Process(target=_measure, args=(kind, candidate[kind], start, results))
+            for kind in _WORKLOADS
+            ]
+        for process in processes:
+            process.start()
+        time.sleep(1.0)
+        start.set()
+        for process in processes:
+            process.join()
+        return dict(results)
+
+
+def tune(logger, refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    returns the thread settings for the text & image processes. the splits of the cores are measured
+    with both workloads running at the same time, the one with the lowest latency (relative to the
+    first candidate) wins. the result is cached per host.
+    """
+    path = get_cache_path()
+    if not refresh and os.path.isfile(path):
+        with open(path) as file:
+            best = json.load(file)
+        logger.info(f'using cached thread settings from "{path}": {best}')
+        return best
+
+    candidates = _candidates()
+    logger.info(f'tuning thread settings ({len(candidates)} candidates)...')
+    best, best_score, reference = None, None, None
+    for candidate in candidates:
+        results = _run_candidate(candidate)
+        if set(results) != set(_WORKLOADS):
+            logger.warning(f'measuring {candidate} failed')
+            continue
+        reference = reference or results
+        score = sum(results[kind] / reference[kind] for kind in _WORKLOADS)
+        logger.debug(
+            f'{candidate}: text {results["text"] * 1000:.2f}ms, image {results["image"] * 1000:.2f}ms, score {score:.3f}'
+            )
+        if best_score is None or score < best_score:
+            best, best_score = candidate, score
+    if best is None:
+        raise RuntimeError('thread tuning failed for all candidates')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(best, file)
+    os.replace(f'{path}.tmp', path)
+    logger.info(f'tuned thread settings: {best}')
+    return best
@@ -0,0 +1,142 @@
+from typing import Dict, Any, Tuple
+
+import os
+import re
+import json
+import hashlib
+import torch
+
+
+def get_model_hash(network: str) -> str:
+    """
+    returns a short content hash of a network .pkl file. the hash is kept in a sidecar file next to
+    the network & only recomputed, when the size or modification time of the network changed.
+    """
+    stat = os.stat(network)
+    sidecar = f'{os.path.splitext(network)[0]}.sha256.json'
+    key = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    try:
+        with open(sidecar) as file:
+            stored = json.load(file)
+        if stored['size'] == key['size'] and stored['mtime_ns'] == key['mtime_ns']:
+            return stored['hash']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass  # missing or broken sidecar
+
+    sha = hashlib.sha256()
+    with open(network, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            sha.update(chunk)
+    model_hash = sha.hexdigest()[:16]
+    try:
+        with open(f'{sidecar}.tmp', 'w') as file:
+            json.dump({**key, 'hash': model_hash}, file)
+        os.replace(f'{sidecar}.tmp', sidecar)
+    except OSError:
+        pass  # read-only model directory: hash again on the next start
+    return model_hash
+
+
+def get_traced_path(network: str) -> str:
+    """
+    returns the path of the traced generator belonging to a network .pkl file.
+    the artifact is keyed by the model hash and the torch version, so stale artifacts are never loaded.
+    """
+    torch_version = re.sub(r'[^0-9a-zA-Z]+', '_', torch.__version__)
+    return f'{os.path.splitext(network)[0]}_traced_{get_model_hash(network)}_torch{torch_version}.pt'
+
+
+def to_uint8(img: torch.Tensor) -> torch.Tensor:
+    """
+    converts the synthesis output [N, 3, H, W] in [-1, 1] to uint8 images [N, H, W, 3].
+    the conversion runs in-place & writes the uint8 tensor channels last, so the returned
+    permuted view is contiguous and can be handed to numpy & pillow without another copy.
+    """
+    img = img.float().mul_(127.5).add_(128).clamp_(0, 255)
+    return img.to(torch.uint8, memory_format=torch.channels_last).permute(0, 2, 3, 1)
+
+
+class TraceableGenerator(torch.nn.Module):
+    """
+    wraps G_ema, so the mapping network and the synthesis network (incl. the conversion to uint8)
+    can be traced as two methods of one module.
+    """
+    def __init__(self, G: torch.nn.Module, noise_mode: str) -> None:
+        super().__init__()
+        self.G = G
+        self.noise_mode = noise_mode
+        self.register_buffer('w_avg', G.mapping.w_avg.detach().clone())
+
+    def forward(
+            self,
+            ws: torch.Tensor,  # [N, num_ws, w_dim]
+            transform: torch.Tensor  # [3, 3] inverse rotation/translation matrix
+        ) -> torch.Tensor:
+        if hasattr(self.G.synthesis, 'input'):
+            self.G.synthesis.input.transform.copy_(transform)
+        return to_uint8(self.G.synthesis(ws, noise_mode=self.noise_mode))
+
+    def mapping(self, z: torch.Tensor, c: torch.Tensor) -> torch.Tensor:
+        # the mapping network broadcasts the same w to all layers
+        return self.G.mapping(z, c, truncation_psi=1)[:, 0]
+
+
+def trace_generator(
+        G: torch.nn.Module,  # G_ema on the cpu
+        batch_size: int,  # batch size the artifact runs at
+        noise_mode: str = 'const'
+    ) -> Tuple[torch.jit.ScriptModule, Dict[str, Any]]:
+    """
+    traces G_ema for cpu inference and returns the traced module together with its metadata.
+    the native cpu plugins are skipped while tracing, so only standard torch ops end up in the graph.
+    """
+    module = TraceableGenerator(G, noise_mode).eval().requires_grad_(False)
+    z = torch.randn([batch_size, G.z_dim])
+    c = torch.zeros([batch_size, G.c_dim])
+    ws = torch.randn([batch_size, G.mapping.num_ws, G.w_dim])
+    transform = torch.eye(3)
+
+    with torch.no_grad():
+        traced = torch.jit.trace_module(
+            module, {
+                'forward': (ws, transform), 'mapping': (z, c)
+                },
+            check_trace=False
+            )
+
+    meta = {
+        'z_dim': G.z_dim,
+        'c_dim': G.c_dim,
+        'w_dim': G.w_dim,
+        'num_ws': G.mapping.num_ws,
+        'batch_size': batch_size,
+        'noise_mode': noise_mode
+        }
+    return traced, meta
+
+
+def freeze_generator(
+        traced: torch.jit.ScriptModule
+    ) -> torch.jit.ScriptModule:
+    """
+    folds the weights into the graph as constants, which lets the jit fuse the ops around them.
+    """
+    return torch.jit.freeze(traced, preserved_attrs=['mapping', 'w_avg'])
+
+
+def save_traced(
+        traced: torch.jit.ScriptModule, meta: Dict[str, Any], path: str
+    ) -> None:
+    # write to a temporary file first, so a starting generator never sees a half written artifact
+    torch.jit.save(
+        traced, f'{path}.tmp', _extra_files={'meta.json': json.dumps(meta)}
+        )
+    os.replace(f'{path}.tmp', path)
+
+
+def load_traced(path: str) -> Tuple[torch.jit.ScriptModule, Dict[str, Any]]:
+    extra_files = {'meta.json': ''}
+    traced = torch.jit.load(
+        path, map_location='cpu', _extra_files=extra_files
+        )
+    return traced.eval(), json.loads(extra_files['meta.json'])
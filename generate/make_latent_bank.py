@@ -0,0 +1,108 @@
+# script for precomputing the w latents of a seed range for each writer
+# the banks are memory-mapped by the image generators, so the mapping network
+# does not need to run during the chat
+#
+# zeno gries 2023
+
+from typing import Union, List
+
+import os
+import json
+import click
+import logging
+import numpy as np
+
+from generators.image_generator import ImageGenerator
+from generators.latent_bank import get_bank_path, get_meta_path
+from generators.traced_generator import get_model_hash
+
+
+# click parsers
+def parse_comma_list(s: Union[str, List]) -> List[str]:
+    if isinstance(s, list):
+        return s
+
+    return [item for item in map(str.strip, str(s).split(','))]
+
+
+# yapf: disable
+@click.command()
+@click.option('--stylegan_dir', type=click.Path(exists=True, file_okay=False), help='directory of stylegan3 model file (formatted like this: \'folder/{{role}}_stylegan3_model.pkl\')', required=True)
+@click.option('--roles',        type=parse_comma_list,                         help='list of roles (e.g \'artist, scientist\'). must be all lower case', required=True)
+@click.option('--seed_start',   type=int, default=0,                           help='first seed of the bank', required=True)
+@click.option('--num_seeds',    type=int, default=20000,                       help='how many consecutive seeds the bank holds', required=True)
+@click.option('--batch',        type=int, default=256,                         help='how many seeds are mapped at a time', required=True)
+@click.option('--verbose',      is_flag=True,                                  help='print additional information')
+# yapf: enable
+def make_latent_bank(
+        stylegan_dir: str,
+        roles: List[str],
+        seed_start: int,
+        num_seeds: int,
+        batch: int,
+        verbose: bool
+    ) -> None:
+    """
+    precomputes w latents for a range of seeds into a memory-mapped .npy bank per role.
+    """
+
+    # setup logging
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        )
+    logger = logging.getLogger(__name__)
+
+    if num_seeds <= 0:
+        raise click.BadParameter('the bank must hold at least one seed', param_hint='--num_seeds')
+    if batch <= 0:
+        raise click.BadParameter('at least one seed must be mapped at a time', param_hint='--batch')
+
+    for role in roles:
+        network = os.path.join(stylegan_dir, f'{role}_stylegan3_model.pkl')
+        bank = get_bank_path(network)
+        image_G = ImageGenerator(logger, network)
+
+        # write to a temporary file first, so a running generator never sees a half written bank
+        ws = None
+        for offset in range(0, num_seeds, batch):
+            seeds = list(
+                range(
+                    seed_start + offset,
+                    seed_start + min(offset + batch, num_seeds)
+                    )
+                )
+            chunk = image_G.map_seeds(seeds)
+            if ws is None:
+                ws = np.lib.format.open_memmap(
+                    f'{bank}.tmp',
+                    mode='w+',
+                    dtype=np.float32,
+                    shape=(num_seeds, chunk.shape[1])
+                    )
+            ws[offset:offset + len(seeds)] = chunk
+            logger.debug(f"mapped seeds {seeds[0]} to {seeds[-1]} for '{role}'")
+        ws.flush()
+        del ws
+
+        # the metadata goes first, so a bank is never there without the metadata it was written with
+        meta = {
+            'seed_start': seed_start,
+            'num_seeds': num_seeds,
+            'network': os.path.basename(network),
+            'model_hash': get_model_hash(network)
+            }
+        meta_path = get_meta_path(bank)
+        with open(f'{meta_path}.tmp', 'w') as file:
+            json.dump(meta, file)
+        os.replace(f'{meta_path}.tmp', meta_path)
+        os.replace(f'{bank}.tmp', bank)
+
+        logger.info(
+            f"saved w latent bank for '{role}' with seeds {seed_start} to {seed_start + num_seeds - 1} to \"{bank}\""
+            )
+
+
+if __name__ == '__main__':
+    make_latent_bank()
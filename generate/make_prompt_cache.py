@@ -0,0 +1,44 @@
+# script for precomputing the past key/values of the starting prompts
+# the text generator warm starts from them, whenever a new run begins
+# (see --prompt_cache of generate.py)
+#
+# zeno gries 2023
+
+import json
+import click
+import logging
+
+from generators.text_generator import TextGenerator, get_prompt_cache_dir
+
+
+# yapf: disable
+@click.command()
+@click.option('--gpt_dir',      type=click.Path(exists=True, file_okay=False), help='directory of the gpt-2 model', required=True)
+@click.option('--prompts_file', type=click.Path(exists=True, dir_okay=False),  help='path to json file with starting prompts', required=True)
+@click.option('--verbose',      is_flag=True,                                  help='print additional information')
+# yapf: enable
+def make_prompt_cache(gpt_dir: str, prompts_file: str, verbose: bool) -> None:
+    """
+    stores the past key/values of every starting prompt for the gpt-2 model.
+    """
+
+    # setup logging
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        )
+    logger = logging.getLogger(__name__)
+
+    with open(prompts_file) as file:
+        prompts = json.load(file)
+
+    text_G = TextGenerator(logger, model_folder=gpt_dir)
+    count = text_G.save_prompt_cache(prompts)
+    logger.info(
+        f'stored {count} prompts for "{gpt_dir}" in "{get_prompt_cache_dir(gpt_dir)}"'
+        )
+
+
+if __name__ == '__main__':
+    make_prompt_cache()
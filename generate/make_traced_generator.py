@@ -0,0 +1,77 @@
+# script for tracing the stylegan3 generator of each writer for cpu inference
+# the traced artifacts are saved next to the .pkl files and are loaded by the image
+# generators instead of unpickling & running the network modules eagerly
+#
+# zeno gries 2023
+
+from typing import Union, List
+
+import os
+import click
+import pickle
+import logging
+import torch
+
+from generators.traced_generator import get_traced_path, trace_generator, freeze_generator, save_traced
+
+
+# click parsers
+def parse_comma_list(s: Union[str, List]) -> List[str]:
+    if isinstance(s, list):
+        return s
+
+    return [item for item in map(str.strip, str(s).split(','))]
+
+
+# yapf: disable
+@click.command()
+@click.option('--stylegan_dir', type=click.Path(exists=True, file_okay=False), help='directory of stylegan3 model file (formatted like this: \'folder/{{role}}_stylegan3_model.pkl\')', required=True)
+@click.option('--roles',        type=parse_comma_list,                         help='list of roles (e.g \'artist, scientist\'). must be all lower case', required=True)
+@click.option('--batch',        type=int, default=4,                           help='batch size the generator is traced at (should match --image_batch of generate.py)', required=True)
+@click.option('--noise_mode',   type=click.Choice(['const', 'random', 'none']), default='const', help='noise mode that gets baked into the trace', required=True)
+@click.option('--verbose',      is_flag=True,                                  help='print additional information')
+# yapf: enable
+def make_traced_generator(
+        stylegan_dir: str,
+        roles: List[str],
+        batch: int,
+        noise_mode: str,
+        verbose: bool
+    ) -> None:
+    """
+    traces the generator of each role for cpu inference into a .pt artifact next to its .pkl.
+    """
+
+    # setup logging
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        )
+    logger = logging.getLogger(__name__)
+
+    for role in roles:
+        network = os.path.join(stylegan_dir, f'{role}_stylegan3_model.pkl')
+        path = get_traced_path(network)
+
+        logger.debug(f'loading networks from "{network}"...')
+        with open(network, 'rb') as file:
+            G = pickle.load(file)['G_ema'].cpu()
+
+        logger.debug(f"tracing generator for '{role}' at batch size {batch}...")
+        traced, meta = trace_generator(G, batch, noise_mode=noise_mode)
+        try:
+            traced = freeze_generator(traced)
+        except RuntimeError as e:
+            logger.warning(
+                f"could not freeze the traced generator for '{role}', saving it unfrozen: {e}"
+                )
+        meta['network'] = os.path.basename(network)
+        meta['torch'] = torch.__version__
+        save_traced(traced, meta, path)
+
+        logger.info(f"saved traced generator for '{role}' to \"{path}\"")
+
+
+if __name__ == '__main__':
+    make_traced_generator()
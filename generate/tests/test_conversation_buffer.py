@@ -0,0 +1,27 @@
+import re
+
+from generators.conversation_buffer import ConversationBuffer
+
+_SPLIT = re.compile(r'(?=\[\w+\])')
+_ROLE = re.compile(r'\[\w+\]')
+
+
+def test_reject_after_accept_is_not_wasted():
+    conversation = ConversationBuffer(_SPLIT, _ROLE)
+    conversation.fill(['[a] one\n[b] two\n[a] three\n'])
+    conversation.accept()
+    conversation.reject()
+    assert conversation.next() is None
+    assert conversation.displayed == 1
+    assert conversation.wasted == 0
+
+
+def test_reject_of_every_candidate_is_wasted_once():
+    conversation = ConversationBuffer(_SPLIT, _ROLE)
+    conversation.fill(['[a] one\n', '[b] two\n'])
+    conversation.reject()
+    assert conversation.next() == '[b] two\n'
+    conversation.reject()
+    assert conversation.next() is None
+    assert conversation.wasted == 1
+    assert conversation.wasted_rate() == 1.0
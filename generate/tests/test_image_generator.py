@@ -0,0 +1,143 @@
+import logging
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+import numpy as np
+
+from generators.image_generator import ImageGenerator, encode_jpeg
+from generators.traced_generator import get_traced_path, trace_generator, save_traced, to_uint8
+
+# batch size the graphs are made with
+_BATCH = 4
+
+
+class _Mapping(torch.nn.Module):
+    def __init__(self, c_dim) -> None:
+        super().__init__()
+        self.num_ws = 2
+        self.fc = torch.nn.Linear(8, 8)
+        self.embed = torch.nn.Linear(c_dim, 8) if c_dim else None
+        self.register_buffer('w_avg', torch.zeros([8]))
+
+    def forward(self, z, c, truncation_psi=1):
+        x = self.fc(z)
+        if self.embed is not None:
+            x = x + self.embed(c)
+        return x.unsqueeze(1).repeat([1, self.num_ws, 1])
+
+
+class _Synthesis(torch.nn.Module):
+    def __init__(self) -> None:
+        super().__init__()
+        self.fc = torch.nn.Linear(8, 3 * 4 * 4)
+
+    def forward(self, ws, noise_mode='const'):
+        return torch.tanh(self.fc(ws[:, 0])).reshape([-1, 3, 4, 4])
+
+
+class _G(torch.nn.Module):
+    # a generator shaped like G_ema
+    def __init__(self, c_dim) -> None:
+        super().__init__()
+        self.z_dim, self.c_dim, self.w_dim = 8, c_dim, 8
+        self.mapping = _Mapping(c_dim)
+        self.synthesis = _Synthesis()
+
+
+def _reference(G, seeds):
+    z = torch.from_numpy(
+        np.concatenate([np.random.RandomState(seed).randn(1, 8) for seed in seeds])
+        ).float()
+    c = torch.zeros([len(seeds), G.c_dim])
+    with torch.no_grad():
+        return to_uint8(G.synthesis(G.mapping(z, c))).numpy()
+
+
+def _export(backend, G, network):
+    if backend == 'traced':
+        traced, meta = trace_generator(G, _BATCH)
+        save_traced(traced, meta, get_traced_path(network))
+    else:
+        pytest.importorskip('onnxruntime')
+        from generators.onnx_generator import export_onnx
+        export_onnx(G, network, _BATCH)
+
+
+@pytest.mark.parametrize('backend', ['traced', 'onnx'])
+@pytest.mark.parametrize('c_dim', [0, 2])
+@pytest.mark.parametrize('seeds', [[0], [0, 1, 2, 3], [0, 1, 2, 3, 4, 5]])
+def test_batch_sizes_other_than_the_graph(tmp_path, backend, c_dim, seeds):
+    torch.manual_seed(0)
+    G = _G(c_dim).eval()
+    network = str(tmp_path / 'test_stylegan3_model.pkl')
+    with open(network, 'wb') as file:
+        file.write(b'network')
+    _export(backend, G, network)
+
+    image_G = ImageGenerator(logging.getLogger(__name__), network, backend=backend)
+    assert image_G._G is None  # running the graph, not the pickle
+    images = image_G.generate_batch(seeds)
+    expected = _reference(G, seeds)
+    assert len(images) == len(seeds)
+    for image, reference in zip(images, expected):
+        assert np.abs(np.asarray(image).astype(int) - reference).max() <= 1
+    if len(seeds) == 1:
+        assert np.array_equal(np.asarray(image_G.generate(seeds[0])), np.asarray(images[0]))
+
+
+
+def test_jpegs_are_encoded_once(tmp_path):
+    # the main loop sends these bytes to redis & writes them to out_dir as they are
+    G = _G(0).eval()
+    network = str(tmp_path / 'test_stylegan3_model.pkl')
+    with open(network, 'wb') as file:
+        file.write(b'network')
+    _export('traced', G, network)
+
+    image_G = ImageGenerator(logging.getLogger(__name__), network, backend='traced')
+    seeds = [0, 1, 2]
+    images = image_G.generate_jpegs(seeds)
+    assert images == [encode_jpeg(image) for image in image_G.generate_batch(seeds)]
+    assert all(image.startswith(b'\xff\xd8') for image in images)
+
+
+def test_stale_onnx_export(tmp_path):
+    pytest.importorskip('onnxruntime')
+    from generators.onnx_generator import export_onnx, is_exported
+
+    network = str(tmp_path / 'test_stylegan3_model.pkl')
+    with open(network, 'wb') as file:
+        file.write(b'network')
+    export_onnx(_G(0).eval(), network, _BATCH)
+    assert is_exported(network)
+
+    # retraining the network replaces the .pkl
+    with open(network, 'wb') as file:
+        file.write(b'retrained network')
+    assert not is_exported(network)
+
+
+@pytest.mark.parametrize('stale', [False, True])
+def test_stale_latent_bank(tmp_path, stale):
+    import json
+    from generators.latent_bank import get_bank_path, get_meta_path
+    from generators.traced_generator import get_model_hash
+
+    network = str(tmp_path / 'test_stylegan3_model.pkl')
+    with open(network, 'wb') as file:
+        file.write(b'network')
+    _export('traced', _G(0).eval(), network)
+    bank = get_bank_path(network)
+    np.save(bank, np.zeros([4, 8], dtype=np.float32))
+    with open(get_meta_path(bank), 'w') as file:
+        json.dump({
+            'seed_start': 0,
+            'num_seeds': 4,
+            'network': 'test_stylegan3_model.pkl',
+            'model_hash': 'retrained' if stale else get_model_hash(network)
+            }, file)
+
+    image_G = ImageGenerator(logging.getLogger(__name__), network, w_bank=bank, backend='traced')
+    assert (image_G._w_bank is None) == stale
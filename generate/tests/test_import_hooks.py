@@ -0,0 +1,121 @@
+import os
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+import dnnlib
+from torch_utils import persistence, import_hooks
+
+# the lines of networks_stylegan3.py the patches replace, in a minimal synthesis layer
+_SRC = '''
+import torch
+
+def modulated_conv2d(x, w, demodulate=True):
+    if demodulate:
+        w = w * w.square().mean([1,2,3], keepdim=True).rsqrt()
+    return torch.nn.functional.conv2d(x, w, padding=1)
+
+class SynthesisLayer(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.weight = torch.nn.Parameter(torch.randn([4, 4, 3, 3]))
+        self.size = [8, 8]
+
+    def forward(self, x):
+        theta = torch.eye(2, 3, device=x.device)
+        grids = torch.nn.functional.affine_grid(theta.unsqueeze(0), [1, 1, self.size[1], self.size[0]], align_corners=False)
+        return modulated_conv2d(x, self.weight) + grids[..., 0].unsqueeze(1)
+'''
+
+
+def _load(src):
+    module = persistence._src_to_module(src)  # pylint: disable=protected-access
+    torch.manual_seed(0)
+    return module.SynthesisLayer()
+
+
+def test_patched_synthesis_runs_twice():
+    import_hooks.enable()
+    meta = dnnlib.EasyDict(type='class', version=persistence._version, module_src=_SRC, class_name='SynthesisLayer', state=None)  # pylint: disable=protected-access
+    meta = import_hooks._hook(meta)  # pylint: disable=protected-access
+    assert '_prenormalized_weight(w)' in meta.module_src
+    assert '_cached_affine_grid(self, ' in meta.module_src
+
+    reference, patched = _load(_SRC), _load(meta.module_src)
+    x = torch.randn([2, 4, 8, 8])
+    with torch.no_grad():
+        expected = reference(x)
+        for _ in range(2):
+            assert torch.allclose(patched(x), expected)
+
+        # an in-place update of the weight invalidates the cached normalization
+        reference.weight.mul_(2).add_(1)
+        patched.weight.mul_(2).add_(1)
+        assert torch.allclose(patched(x), reference(x))
+
+
+# the generator source the stylegan3 pickles embed (training/networks_stylegan3.py)
+_STYLEGAN3_PATH = os.path.join(os.path.dirname(__file__), 'data', 'networks_stylegan3.py')
+
+
+def _stylegan3_patches():
+    return [name for name in import_hooks._patches if name.startswith('stylegan3_')]  # pylint: disable=protected-access
+
+
+@pytest.mark.parametrize('name', _stylegan3_patches())
+def test_patch_matches_stylegan3_source(name):
+    with open(_STYLEGAN3_PATH) as file:
+        src = file.read()
+    assert import_hooks._patches[name].pattern.search(src) is not None  # pylint: disable=protected-access
+
+
+def _patched_stylegan3_source():
+    pytest.importorskip('scipy')  # designs the filters of the synthesis layers
+    with open(_STYLEGAN3_PATH) as file:
+        src = file.read()
+    import_hooks.enable()
+    meta = dnnlib.EasyDict(type='class', version=persistence._version, module_src=src, class_name='Generator', state=None)  # pylint: disable=protected-access
+    return src, import_hooks._hook(meta)  # pylint: disable=protected-access
+
+
+def _stylegan3_generator(module_src):
+    torch.manual_seed(0)
+    G = persistence._src_to_module(module_src).Generator(  # pylint: disable=protected-access
+        z_dim=8, c_dim=0, w_dim=8, img_resolution=16, img_channels=3, channel_base=256, channel_max=16, num_layers=4, margin_size=2
+        )
+    return G.eval().requires_grad_(False)
+
+
+def test_patched_stylegan3_generator():
+    src, meta = _patched_stylegan3_source()
+    for name in _stylegan3_patches():
+        assert import_hooks._patches[name].helpers in meta.module_src, name  # pylint: disable=protected-access
+
+    reference, patched = _stylegan3_generator(src), _stylegan3_generator(meta.module_src)
+
+    z = torch.randn([2, 8])
+    with torch.no_grad():
+        expected = reference(z, None)
+        for _ in range(2):
+            assert torch.allclose(patched(z, None), expected, atol=1e-5)
+        with pytest.raises(AssertionError):
+            patched(z, None, update_emas=True)
+
+
+def test_bf16_stylegan3_generator():
+    from generators.precision import enable_bf16
+
+    src, meta = _patched_stylegan3_source()
+    reference, patched = _stylegan3_generator(src), _stylegan3_generator(meta.module_src)
+    assert enable_bf16(reference) == 0
+    assert enable_bf16(patched) > 0
+
+    z = torch.randn([2, 8])
+    with torch.no_grad():
+        expected, img = reference(z, None), patched(z, None)
+        # the dtype is set per generator, so other ones with the same network code stay in float32
+        assert torch.allclose(_stylegan3_generator(meta.module_src)(z, None), expected, atol=1e-5)
+    assert img.dtype == torch.float32
+    assert not torch.equal(img, expected)
+    assert torch.allclose(img, expected, atol=5e-2 * expected.abs().max().item())
@@ -0,0 +1,112 @@
+import itertools
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+import numpy as np
+
+from torch_utils import misc
+from torch_utils.ops import bias_act, upfirdn2d, filtered_lrelu
+
+_DTYPES = [torch.float32, torch.float64, torch.bfloat16]
+_ACTS = ['linear', 'relu', 'lrelu', 'tanh', 'sigmoid', 'elu', 'selu', 'softplus', 'swish']
+
+
+@pytest.fixture(params=['torch', 'plugin'])
+def impl(request, monkeypatch):
+    """
+    runs a test with the pure torch cpu path (plugins disabled) or with the native cpu plugins.
+    """
+    for module in [bias_act, upfirdn2d, filtered_lrelu]:
+        if request.param == 'torch':
+            monkeypatch.setattr(module, '_init_cpu', lambda: False)
+        elif not module._init_cpu():
+            pytest.skip(f'the cpu plugin of {module.__name__} could not be built')
+    return request.param
+
+
+@pytest.fixture(params=[False, True], ids=['autograd', 'inference'])
+def inference(request):
+    with misc.inference_mode(request.param):
+        yield request.param
+
+
+def _filter(separable, taps=4, seed=0):
+    f = torch.from_numpy(np.random.RandomState(seed).rand(taps if separable else taps * taps)).float()
+    return f if separable else f.reshape([taps, taps])
+
+
+def _assert_close(y, ref):
+    assert y.shape == ref.shape and y.dtype == ref.dtype
+    if y.dtype == torch.bfloat16:
+        # 8 bits of mantissa, relative to the magnitude of the output
+        y, ref = y.float(), ref.float()
+        tol = 2e-2 * max(1, ref.abs().max().item())
+        assert torch.allclose(y, ref, rtol=2e-2, atol=tol), (y - ref).abs().max()
+        return
+    assert torch.allclose(y, ref, rtol=1e-4, atol=1e-4), (y - ref).abs().max()
+
+
+def _reference(ref_fn, x, *args, **kwargs):
+    """
+    runs a reference op. with bfloat16 inputs, the reference runs in float32 & the reference path
+    in bfloat16 is checked against it as well.
+    """
+    if x.dtype != torch.bfloat16:
+        return ref_fn(x, *args, **kwargs)
+    cast = lambda t: t.float() if isinstance(t, torch.Tensor) and t.dtype == torch.bfloat16 else t
+    ref = ref_fn(cast(x), *map(cast, args), **{key: cast(value) for key, value in kwargs.items()}).bfloat16()
+    _assert_close(ref_fn(x, *args, **kwargs), ref)
+    return ref
+
+
+@pytest.mark.parametrize('dtype', _DTYPES)
+@pytest.mark.parametrize('up, down, padding, flip_filter, gain, separable', list(itertools.product(
+    [1, 2, [2, 1]], [1, 2], [0, 3, [1, 2, -1, 3]], [False, True], [1, 2.5], [False, True]
+    )))
+def test_upfirdn2d(impl, inference, dtype, up, down, padding, flip_filter, gain, separable):
+    torch.manual_seed(0)
+    x = torch.randn([2, 3, 9, 10], dtype=dtype)
+    f = _filter(separable)
+    y = upfirdn2d.upfirdn2d(x, f, up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain, impl='cpu')
+    ref = _reference(upfirdn2d._upfirdn2d_ref, x, f, up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain)
+    _assert_close(y, ref)
+
+
+@pytest.mark.parametrize('dtype', _DTYPES)
+@pytest.mark.parametrize('act, alpha, gain, clamp, bias', list(itertools.product(
+    _ACTS, [None, 0.1], [None, 2.0], [None, 0.5], [False, True]
+    )))
+def test_bias_act(impl, inference, dtype, act, alpha, gain, clamp, bias):
+    torch.manual_seed(0)
+    x = torch.randn([2, 5, 4, 3], dtype=dtype)
+    b = torch.randn([5], dtype=dtype) if bias else None
+    y = bias_act.bias_act(x, b, act=act, alpha=alpha, gain=gain, clamp=clamp, impl='cpu')
+    ref = _reference(bias_act._bias_act_ref, x, b, act=act, alpha=alpha, gain=gain, clamp=clamp)
+    _assert_close(y, ref)
+
+
+def _filtered_lrelu_ref(x, fu, fd, b, up, down, padding, gain, slope, clamp, flip_filter):
+    # the steps of filtered_lrelu._filtered_lrelu_ref with the reference ops only (it dispatches to the cpu paths)
+    x = bias_act._bias_act_ref(x=x, b=b)
+    x = upfirdn2d._upfirdn2d_ref(x=x, f=fu, up=up, padding=padding, gain=up**2, flip_filter=flip_filter)
+    x = bias_act._bias_act_ref(x=x, act='lrelu', alpha=slope, gain=gain, clamp=clamp)
+    return upfirdn2d._upfirdn2d_ref(x=x, f=fd, down=down, flip_filter=flip_filter)
+
+
+@pytest.mark.parametrize('dtype', _DTYPES)
+@pytest.mark.parametrize('up, down, padding, gain, slope, clamp, flip_filter, bias', list(itertools.product(
+    [1, 2], [1, 2], [0, [5, 4, 6, 3]], [1, np.sqrt(2)], [0, 0.2], [None, 0.5], [False, True], [False, True]
+    )))
+def test_filtered_lrelu(impl, inference, dtype, up, down, padding, gain, slope, clamp, flip_filter, bias):
+    torch.manual_seed(0)
+    x = torch.randn([2, 3, 10, 11], dtype=dtype)
+    b = torch.randn([3], dtype=dtype) if bias else None
+    fu = _filter(separable=True, taps=6, seed=1) if up > 1 else None
+    fd = _filter(separable=False, taps=6, seed=2) if down > 1 else None
+    y = filtered_lrelu.filtered_lrelu(
+        x, fu=fu, fd=fd, b=b, up=up, down=down, padding=padding, gain=gain, slope=slope, clamp=clamp, flip_filter=flip_filter, impl='cpu'
+        )
+    ref = _reference(_filtered_lrelu_ref, x, fu, fd, b, up, down, padding, gain, slope, clamp, flip_filter)
+    _assert_close(y, ref)
@@ -68,6 +68,13 @@ def get_plugin(module_name, sources, headers=None, source_dir=None, **build_kwar
     if module_name in _cached_plugins:
         return _cached_plugins[module_name]
 
+    # Plugins without CUDA sources are built for the CPU, with optimizations and OpenMP
+    # so that ATen's parallel_for runs multithreaded.
+    cpu_only = not any(fname.endswith('.cu') for fname in sources + headers)
+    if cpu_only:
+        build_kwargs.setdefault('extra_cflags', ['/O2', '/openmp'] if os.name == 'nt' else ['-O3', '-fopenmp'])
+        build_kwargs.setdefault('extra_ldflags', [] if os.name == 'nt' else ['-fopenmp'])
+
     # Print status.
     if verbosity == 'full':
         print(f'Setting up PyTorch plugin "{module_name}"...')
@@ -88,7 +95,8 @@ def get_plugin(module_name, sources, headers=None, source_dir=None, **build_kwar
         # break the build or unnecessarily restrict what's available to nvcc.
         # Unset it to let nvcc decide based on what's available on the
         # machine.
-        os.environ['TORCH_CUDA_ARCH_LIST'] = ''
+        if not cpu_only:
+            os.environ['TORCH_CUDA_ARCH_LIST'] = ''
 
         # Incremental build md5sum trickery.  Copies all the input source files
         # into a cached build directory under a combined md5 digest of the input
@@ -117,7 +125,7 @@ def get_plugin(module_name, sources, headers=None, source_dir=None, **build_kwar
             # Select cached build directory name.
             source_digest = hash_md5.hexdigest()
             build_top_dir = torch.utils.cpp_extension._get_build_directory(module_name, verbose=verbose_build) # pylint: disable=protected-access
-            cached_build_dir = os.path.join(build_top_dir, f'{source_digest}-{_get_mangled_gpu_name()}')
+            cached_build_dir = os.path.join(build_top_dir, f'{source_digest}-{"cpu" if cpu_only else _get_mangled_gpu_name()}')
 
             if not os.path.isdir(cached_build_dir):
                 tmpdir = f'{build_top_dir}/srctmp-{uuid.uuid4().hex}'
@@ -133,13 +141,14 @@ def get_plugin(module_name, sources, headers=None, source_dir=None, **build_kwar
 
             # Compile.
             cached_sources = [os.path.join(cached_build_dir, os.path.basename(fname)) for fname in sources]
-            torch.utils.cpp_extension.load(name=module_name, build_directory=cached_build_dir,
+            module = torch.utils.cpp_extension.load(name=module_name, build_directory=cached_build_dir,
                 verbose=verbose_build, sources=cached_sources, **build_kwargs)
         else:
-            torch.utils.cpp_extension.load(name=module_name, verbose=verbose_build, sources=sources, **build_kwargs)
+            module = torch.utils.cpp_extension.load(name=module_name, verbose=verbose_build, sources=sources, **build_kwargs)
 
-        # Load.
-        module = importlib.import_module(module_name)
+        # Load. Newer PyTorch versions do not register the module in sys.modules, so the returned one is used.
+        if module is None:
+            module = importlib.import_module(module_name)
 
     except:
         if verbosity == 'brief':
@@ -0,0 +1,173 @@
+# Copyright (c) 2021, NVIDIA CORPORATION & AFFILIATES.  All rights reserved.
+#
+# NVIDIA CORPORATION and its licensors retain all intellectual property
+# and proprietary rights in and to this software, related documentation
+# and any modifications thereto.  Any use, reproduction, disclosure or
+# distribution of this software and related documentation without an express
+# license agreement from NVIDIA CORPORATION is strictly prohibited.
+
+"""Opt-in registry of source patches for networks embedded in pickles.
+
+The patches are applied through `persistence.import_hook()` while a network
+pickle is being unpickled, so existing pickles run the patched code without
+retraining or re-exporting. Every patch recognizes the code it replaces by
+an exact pattern and leaves the source untouched if the pattern is missing,
+so pickles made with other versions of the network code keep working."""
+
+import re
+import warnings
+import dnnlib
+from . import persistence
+
+#----------------------------------------------------------------------------
+
+_patches = dict()       # {name: dnnlib.EasyDict(class_names, pattern, repl, helpers), ...}
+_enabled = []           # [name, ...]
+_installed = False      # import hook registered with persistence?
+applied = dict()        # {name: number of persistent classes patched, ...}
+
+def register_patch(name, class_names, pattern, repl, helpers=''):
+    r"""Register a source patch.
+
+    Args:
+        name:        Name of the patch.
+        class_names: Persistent class names that identify a compatible module.
+        pattern:     Regular expression (multiline) matching the code to replace.
+        repl:        Replacement for `pattern`, as for `re.sub()`.
+        helpers:     Source code that is appended to the patched module.
+    """
+    assert name not in _patches
+    _patches[name] = dnnlib.EasyDict(class_names=set(class_names), pattern=re.compile(pattern, re.MULTILINE), repl=repl, helpers=helpers)
+
+def enable(names=None):
+    r"""Enable the given patches (default: all registered patches) for every
+    network pickle that is unpickled from now on.
+    """
+    global _installed
+    for name in (names if names is not None else list(_patches)):
+        assert name in _patches
+        if name not in _enabled:
+            _enabled.append(name)
+    if not _installed:
+        persistence.import_hook(_hook)
+        _installed = True
+
+def is_applied(obj, name):
+    r"""Return True if the given patch is part of the source code of a persistent object.
+    """
+    return _patches[name].helpers in getattr(type(obj), '_orig_module_src', '')
+
+def _hook(meta):
+    if meta.type != 'class' or meta.version != persistence._version: # pylint: disable=protected-access
+        return meta
+    for name in _enabled:
+        patch = _patches[name]
+        if meta.class_name not in patch.class_names or patch.helpers in meta.module_src:
+            continue
+        src, count = patch.pattern.subn(patch.repl, meta.module_src)
+        if count == 0:
+            if name not in applied:
+                warnings.warn(f'Network source patch "{name}" does not match the pickled code of {meta.class_name}; skipping it.')
+                applied[name] = 0
+            continue
+        meta.module_src = src + patch.helpers
+        applied[name] = applied.get(name, 0) + 1
+    return meta
+
+#----------------------------------------------------------------------------
+# StyleGAN3 (networks_stylegan3.py).
+
+_stylegan3_classes = ['Generator', 'MappingNetwork', 'SynthesisNetwork', 'SynthesisInput', 'SynthesisLayer', 'FullyConnectedLayer']
+
+# The sampling grid of the Fourier features only depends on the layer size
+# and sampling rate, so it is computed once per layer and device.
+register_patch(
+    name='stylegan3_input_grid',
+    class_names=_stylegan3_classes,
+    pattern=r'torch\.nn\.functional\.affine_grid\((theta\.unsqueeze\(0\), \[1, 1, self\.size\[1\], self\.size\[0\]\], align_corners=False)\)',
+    repl=r'_cached_affine_grid(self, \1)',
+    helpers='''
+
+#----------------------------------------------------------------------------
+# Patched in by torch_utils.import_hooks (stylegan3_input_grid).
+
+import weakref as _weakref
+_affine_grids = _weakref.WeakKeyDictionary()
+
+def _cached_affine_grid(module, theta, size, align_corners):
+    if torch.is_grad_enabled() or torch.jit.is_tracing():
+        return torch.nn.functional.affine_grid(theta, size, align_corners=align_corners)
+    key = (tuple(size), align_corners, theta.device)
+    grids = _affine_grids.setdefault(module, dict())
+    if key not in grids:
+        grids[key] = torch.nn.functional.affine_grid(theta, size, align_corners=align_corners)
+    return grids[key]
+''')
+
+# The pre-normalization of the convolution weights does not change between
+# forward passes, so it is computed once per weight (and recomputed whenever
+# the weight is modified in-place).
+register_patch(
+    name='stylegan3_weight_norm',
+    class_names=_stylegan3_classes,
+    pattern=r'^([ \t]*)w = w \* w\.square\(\)\.mean\(\[1,\s*2,\s*3\], keepdim=True\)\.rsqrt\(\)[ \t]*$',
+    repl=r'\1w = _prenormalized_weight(w)',
+    helpers='''
+
+#----------------------------------------------------------------------------
+# Patched in by torch_utils.import_hooks (stylegan3_weight_norm).
+
+import weakref as _weakref
+_prenormalized_weights = dict() # {id(weight): (version, prenormalized weight), ...}
+
+def _prenormalized_weight(w):
+    if torch.is_grad_enabled() or torch.jit.is_tracing():
+        return w * w.square().mean([1,2,3], keepdim=True).rsqrt()
+    # Keyed by id, since tensors compare elementwise; the entry is dropped with the weight.
+    key = id(w)
+    cached = _prenormalized_weights.get(key, None)
+    if cached is None:
+        _weakref.finalize(w, _prenormalized_weights.pop, key, None)
+    if cached is None or cached[0] != w._version or cached[1].device != w.device:
+        cached = (w._version, w * w.square().mean([1,2,3], keepdim=True).rsqrt())
+        _prenormalized_weights[key] = cached
+    return cached[1]
+''')
+
+# The moving averages of W and of the input magnitudes are only updated while
+# training, so their branches are dropped from the forward passes.
+register_patch(
+    name='stylegan3_inference_only',
+    class_names=_stylegan3_classes,
+    pattern=r'^([ \t]*)if update_emas:[ \t]*\n(?:\1[ \t]+\S.*\n)+',
+    repl=r'\1assert not update_emas # Training-only branch removed.\n',
+    helpers='''
+
+#----------------------------------------------------------------------------
+# Patched in by torch_utils.import_hooks (stylegan3_inference_only).
+''')
+
+#----------------------------------------------------------------------------
+# The synthesis layers pick their dtype from a fixed rule (float16 for some
+# layers on the GPU, float32 otherwise). With the patch, the dtype on the CPU can
+# be set per layer instance through the `compute_dtype` attribute, e.g. bfloat16
+# (see generators/precision.py).
+register_patch(
+    name='stylegan3_layer_dtype',
+    class_names=_stylegan3_classes,
+    pattern=r"dtype = torch\.float16 if \(self\.use_fp16 and not force_fp32 and x\.device\.type == 'cuda'\) else torch\.float32",
+    repl=r'dtype = _layer_dtype(self, x, force_fp32)',
+    helpers='''
+
+#----------------------------------------------------------------------------
+# Patched in by torch_utils.import_hooks (stylegan3_layer_dtype).
+
+def _layer_dtype(layer, x, force_fp32):
+    if force_fp32:
+        return torch.float32
+    if layer.use_fp16 and x.device.type == 'cuda':
+        return torch.float16
+    return getattr(layer, 'compute_dtype', torch.float32)
+''')
+
+#----------------------------------------------------------------------------
@@ -77,6 +77,26 @@ try:
 except AttributeError:
     symbolic_assert = torch.Assert  # 1.7.0
 
+#----------------------------------------------------------------------------
+# Inference-only execution mode. While enabled, autograd is turned off and the
+# custom ops skip their autograd wrappers, shape assertions, profiler ranges
+# and statistics reporting.
+
+inference_only = False
+
+
+@contextlib.contextmanager
+def inference_mode(enable=True):
+    global inference_only
+    old = inference_only
+    inference_only = enable
+    try:
+        with torch.inference_mode(enable):
+            yield
+    finally:
+        inference_only = old
+
+
 #----------------------------------------------------------------------------
 # Context manager to temporarily suppress known warnings in torch.jit.trace().
 # Note: Cannot use catch_warnings because of https://bugs.python.org/issue29672
@@ -84,6 +104,9 @@ except AttributeError:
 
 @contextlib.contextmanager
 def suppress_tracer_warnings():
+    if inference_only:
+        yield
+        return
     flt = ('ignore', None, torch.jit.TracerWarning, None, 0)
     warnings.filters.insert(0, flt)
     yield
@@ -97,6 +120,8 @@ def suppress_tracer_warnings():
 
 
 def assert_shape(tensor, ref_shape):
+    if inference_only:
+        return
     if tensor.ndim != len(ref_shape):
         raise AssertionError(
             f'Wrong number of dimensions: got {tensor.ndim}, expected {len(ref_shape)}'
@@ -130,6 +155,8 @@ def assert_shape(tensor, ref_shape):
 
 def profiled_function(fn):
     def decorator(*args, **kwargs):
+        if inference_only:
+            return fn(*args, **kwargs)
         with torch.autograd.profiler.record_function(fn.__name__):
             return fn(*args, **kwargs)
 
@@ -11,6 +11,7 @@
 import os
 import numpy as np
 import torch
+import warnings
 import dnnlib
 
 from .. import custom_ops
@@ -47,6 +48,25 @@ def _init():
         )
     return True
 
+_cpu_plugin = None
+
+def _init_cpu():
+    global _cpu_plugin
+    if _cpu_plugin is None:
+        try:
+            _cpu_plugin = custom_ops.get_plugin(
+                module_name='bias_act_cpu_plugin',
+                sources=['bias_act_cpu.cpp'],
+                source_dir=os.path.dirname(__file__),
+            )
+        except Exception: # pylint: disable=broad-except
+            warnings.warn('Failed to build CPU plugin for bias_act. Falling back to the pure PyTorch implementation.')
+            _cpu_plugin = False
+    return _cpu_plugin is not False
+
+def _get_plugin(x):
+    return _plugin if x.device.type == 'cuda' else _cpu_plugin
+
 #----------------------------------------------------------------------------
 
 def bias_act(x, b=None, dim=1, act='linear', alpha=None, gain=None, clamp=None, impl='cuda'):
@@ -74,14 +94,19 @@ def bias_act(x, b=None, dim=1, act='linear', alpha=None, gain=None, clamp=None,
                 If unsure, consider specifying 1.
         clamp:  Clamp the output values to `[-clamp, +clamp]`, or `None` to disable
                 the clamping (default).
-        impl:   Name of the implementation to use. Can be `"ref"` or `"cuda"` (default).
+        impl:   Name of the implementation to use. Can be `"ref"`, `"cuda"` (default) or `"cpu"`.
+                `"cuda"` selects the `"cpu"` implementation for tensors on the CPU.
 
     Returns:
         Tensor of the same shape and datatype as `x`.
     """
     assert isinstance(x, torch.Tensor)
-    assert impl in ['ref', 'cuda']
-    if impl == 'cuda' and x.device.type == 'cuda' and _init():
+    assert impl in ['ref', 'cuda', 'cpu']
+    use_plugin = impl == 'cuda' and x.device.type == 'cuda' and _init()
+    use_plugin = use_plugin or (impl in ['cuda', 'cpu'] and x.device.type == 'cpu' and x.dtype in [torch.float32, torch.float64] and not torch.jit.is_tracing() and _init_cpu())
+    if use_plugin and misc.inference_only:
+        return _bias_act_plugin(x=x, b=b, dim=dim, act=act, alpha=alpha, gain=gain, clamp=clamp)
+    if use_plugin:
         return _bias_act_cuda(dim=dim, act=act, alpha=alpha, gain=gain, clamp=clamp).apply(x, b)
     return _bias_act_ref(x=x, b=b, dim=dim, act=act, alpha=alpha, gain=gain, clamp=clamp)
 
@@ -121,10 +146,30 @@ def _bias_act_ref(x, b=None, dim=1, act='linear', alpha=None, gain=None, clamp=N
 
 #----------------------------------------------------------------------------
 
+def _bias_act_plugin(x, b=None, dim=1, act='linear', alpha=None, gain=None, clamp=None):
+    """Calls the CUDA or CPU plugin directly, without autograd bookkeeping.
+    Only used in inference-only mode.
+    """
+    assert clamp is None or clamp >= 0
+    spec = activation_funcs[act]
+    alpha = float(alpha if alpha is not None else spec.def_alpha)
+    gain = float(gain if gain is not None else spec.def_gain)
+    clamp = float(clamp if clamp is not None else -1)
+
+    memory_format = torch.channels_last if x.ndim > 2 and x.stride(1) == 1 else torch.contiguous_format
+    x = x.contiguous(memory_format=memory_format)
+    if act == 'linear' and gain == 1 and clamp < 0 and b is None:
+        return x
+    b = b.contiguous() if b is not None else _null_tensor
+    return _get_plugin(x).bias_act(x, b, _null_tensor, _null_tensor, _null_tensor, 0, dim, spec.cuda_idx, alpha, gain, clamp)
+
+#----------------------------------------------------------------------------
+
 _bias_act_cuda_cache = dict()
 
 def _bias_act_cuda(dim=1, act='linear', alpha=None, gain=None, clamp=None):
-    """Fast CUDA implementation of `bias_act()` using custom ops.
+    """Fast CUDA implementation of `bias_act()` using custom ops. Also runs the
+    native CPU plugin for tensors on the CPU.
     """
     # Parse arguments.
     assert clamp is None or clamp >= 0
@@ -147,7 +192,7 @@ def _bias_act_cuda(dim=1, act='linear', alpha=None, gain=None, clamp=None):
             b = b.contiguous() if b is not None else _null_tensor
             y = x
             if act != 'linear' or gain != 1 or clamp >= 0 or b is not _null_tensor:
-                y = _plugin.bias_act(x, b, _null_tensor, _null_tensor, _null_tensor, 0, dim, spec.cuda_idx, alpha, gain, clamp)
+                y = _get_plugin(x).bias_act(x, b, _null_tensor, _null_tensor, _null_tensor, 0, dim, spec.cuda_idx, alpha, gain, clamp)
             ctx.save_for_backward(
                 x if 'x' in spec.ref or spec.has_2nd_grad else _null_tensor,
                 b if 'x' in spec.ref or spec.has_2nd_grad else _null_tensor,
@@ -176,7 +221,7 @@ def _bias_act_cuda(dim=1, act='linear', alpha=None, gain=None, clamp=None):
         @staticmethod
         def forward(ctx, dy, x, b, y): # pylint: disable=arguments-differ
             ctx.memory_format = torch.channels_last if dy.ndim > 2 and dy.stride(1) == 1 else torch.contiguous_format
-            dx = _plugin.bias_act(dy, b, x, y, _null_tensor, 1, dim, spec.cuda_idx, alpha, gain, clamp)
+            dx = _get_plugin(dy).bias_act(dy, b, x, y, _null_tensor, 1, dim, spec.cuda_idx, alpha, gain, clamp)
             ctx.save_for_backward(
                 dy if spec.has_2nd_grad else _null_tensor,
                 x, b, y)
@@ -195,7 +240,7 @@ def _bias_act_cuda(dim=1, act='linear', alpha=None, gain=None, clamp=None):
                 d_dy = BiasActCudaGrad.apply(d_dx, x, b, y)
 
             if spec.has_2nd_grad and (ctx.needs_input_grad[1] or ctx.needs_input_grad[2]):
-                d_x = _plugin.bias_act(d_dx, b, x, y, dy, 2, dim, spec.cuda_idx, alpha, gain, clamp)
+                d_x = _get_plugin(d_dx).bias_act(d_dx, b, x, y, dy, 2, dim, spec.cuda_idx, alpha, gain, clamp)
 
             if spec.has_2nd_grad and ctx.needs_input_grad[2]:
                 d_b = d_x.sum([i for i in range(d_x.ndim) if i != dim])
@@ -0,0 +1,214 @@
+#include <torch/extension.h>
+#include <ATen/Parallel.h>
+#include <cmath>
+
+//------------------------------------------------------------------------
+
+static bool has_same_layout(torch::Tensor x, torch::Tensor y)
+{
+    if (x.dim() != y.dim())
+        return false;
+    for (int64_t i = 0; i < x.dim(); i++)
+    {
+        if (x.size(i) != y.size(i))
+            return false;
+        if (x.size(i) >= 2 && x.stride(i) != y.stride(i))
+            return false;
+    }
+    return true;
+}
+
+//------------------------------------------------------------------------
+// CPU kernel, same semantics as the CUDA kernel in bias_act.cu.
+
+template <class T, int A>
+static void bias_act_kernel(const T* px, const T* pb, const T* pxref, const T* pyref, const T* pdy, T* py,
+    int G, float p_alpha, float p_gain, float p_clamp, int64_t begin, int64_t end, int64_t sizeB, int64_t stepB)
+{
+    T alpha        = (T)p_alpha;
+    T gain         = (T)p_gain;
+    T clamp        = (T)p_clamp;
+    T one          = (T)1;
+    T two          = (T)2;
+    T expRange     = (T)80;
+    T halfExpRange = (T)40;
+    T seluScale    = (T)1.0507009873554804934193349852946;
+    T seluAlpha    = (T)1.6732632423543772848170429916717;
+
+    for (int64_t xi = begin; xi < end; xi++)
+    {
+        // Load.
+        T x = px[xi];
+        T b = (pb) ? pb[(xi / stepB) % sizeB] : 0;
+        T xref = (pxref) ? pxref[xi] : 0;
+        T yref = (pyref) ? pyref[xi] : 0;
+        T dy = (pdy) ? pdy[xi] : one;
+        T yy = (gain != 0) ? yref / gain : 0;
+        T y = 0;
+
+        // Apply bias.
+        ((G == 0) ? x : xref) += b;
+
+        // linear
+        if (A == 1)
+        {
+            if (G == 0) y = x;
+            if (G == 1) y = x;
+        }
+
+        // relu
+        if (A == 2)
+        {
+            if (G == 0) y = (x > 0) ? x : 0;
+            if (G == 1) y = (yy > 0) ? x : 0;
+        }
+
+        // lrelu
+        if (A == 3)
+        {
+            if (G == 0) y = (x > 0) ? x : x * alpha;
+            if (G == 1) y = (yy > 0) ? x : x * alpha;
+        }
+
+        // tanh
+        if (A == 4)
+        {
+            if (G == 0) { T c = std::exp(x); T d = one / c; y = (x < -expRange) ? -one : (x > expRange) ? one : (c - d) / (c + d); }
+            if (G == 1) y = x * (one - yy * yy);
+            if (G == 2) y = x * (one - yy * yy) * (-two * yy);
+        }
+
+        // sigmoid
+        if (A == 5)
+        {
+            if (G == 0) y = (x < -expRange) ? 0 : one / (std::exp(-x) + one);
+            if (G == 1) y = x * yy * (one - yy);
+            if (G == 2) y = x * yy * (one - yy) * (one - two * yy);
+        }
+
+        // elu
+        if (A == 6)
+        {
+            if (G == 0) y = (x >= 0) ? x : std::exp(x) - one;
+            if (G == 1) y = (yy >= 0) ? x : x * (yy + one);
+            if (G == 2) y = (yy >= 0) ? 0 : x * (yy + one);
+        }
+
+        // selu
+        if (A == 7)
+        {
+            if (G == 0) y = (x >= 0) ? seluScale * x : (seluScale * seluAlpha) * (std::exp(x) - one);
+            if (G == 1) y = (yy >= 0) ? x * seluScale : x * (yy + seluScale * seluAlpha);
+            if (G == 2) y = (yy >= 0) ? 0 : x * (yy + seluScale * seluAlpha);
+        }
+
+        // softplus
+        if (A == 8)
+        {
+            if (G == 0) y = (x > expRange) ? x : std::log(std::exp(x) + one);
+            if (G == 1) y = x * (one - std::exp(-yy));
+            if (G == 2) { T c = std::exp(-yy); y = x * c * (one - c); }
+        }
+
+        // swish
+        if (A == 9)
+        {
+            if (G == 0)
+                y = (x < -expRange) ? 0 : x / (std::exp(-x) + one);
+            else
+            {
+                T c = std::exp(xref);
+                T d = c + one;
+                if (G == 1)
+                    y = (xref > halfExpRange) ? x : x * c * (xref + d) / (d * d);
+                else
+                    y = (xref > halfExpRange) ? 0 : x * c * (xref * (two - d) + two * d) / (d * d * d);
+                yref = (xref < -expRange) ? 0 : xref / (std::exp(-xref) + one) * gain;
+            }
+        }
+
+        // Apply gain.
+        y *= gain * dy;
+
+        // Clamp.
+        if (clamp >= 0)
+        {
+            if (G == 0)
+                y = (y > -clamp && y < clamp) ? y : (y >= 0) ? clamp : -clamp;
+            else
+                y = (yref > -clamp && yref < clamp) ? y : 0;
+        }
+
+        // Store.
+        py[xi] = y;
+    }
+}
+
+//------------------------------------------------------------------------
+
+static torch::Tensor bias_act(torch::Tensor x, torch::Tensor b, torch::Tensor xref, torch::Tensor yref, torch::Tensor dy, int grad, int dim, int act, float alpha, float gain, float clamp)
+{
+    // Validate arguments.
+    TORCH_CHECK(x.device().is_cpu(), "x must reside on CPU device");
+    TORCH_CHECK(x.dtype() == torch::kFloat || x.dtype() == torch::kDouble, "x must be float32 or float64");
+    TORCH_CHECK(b.numel() == 0 || (b.dtype() == x.dtype() && b.device() == x.device()), "b must have the same dtype and device as x");
+    TORCH_CHECK(xref.numel() == 0 || (xref.sizes() == x.sizes() && xref.dtype() == x.dtype() && xref.device() == x.device()), "xref must have the same shape, dtype, and device as x");
+    TORCH_CHECK(yref.numel() == 0 || (yref.sizes() == x.sizes() && yref.dtype() == x.dtype() && yref.device() == x.device()), "yref must have the same shape, dtype, and device as x");
+    TORCH_CHECK(dy.numel() == 0 || (dy.sizes() == x.sizes() && dy.dtype() == x.dtype() && dy.device() == x.device()), "dy must have the same dtype and device as x");
+    TORCH_CHECK(b.dim() == 1, "b must have rank 1");
+    TORCH_CHECK(b.numel() == 0 || (dim >= 0 && dim < x.dim()), "dim is out of bounds");
+    TORCH_CHECK(b.numel() == 0 || b.numel() == x.size(dim), "b has wrong number of elements");
+    TORCH_CHECK(grad >= 0, "grad must be non-negative");
+    TORCH_CHECK(act >= 1 && act <= 9, "no CPU kernel found for the specified activation func");
+
+    // Validate layout.
+    TORCH_CHECK(x.is_non_overlapping_and_dense(), "x must be non-overlapping and dense");
+    TORCH_CHECK(b.is_contiguous(), "b must be contiguous");
+    TORCH_CHECK(xref.numel() == 0 || has_same_layout(xref, x), "xref must have the same layout as x");
+    TORCH_CHECK(yref.numel() == 0 || has_same_layout(yref, x), "yref must have the same layout as x");
+    TORCH_CHECK(dy.numel() == 0 || has_same_layout(dy, x), "dy must have the same layout as x");
+
+    // Create output tensor.
+    torch::Tensor y = torch::empty_like(x);
+    TORCH_CHECK(has_same_layout(y, x), "y must have the same layout as x");
+
+    // Elements are visited in memory order, so the bias index follows the stride of `dim`.
+    int64_t sizeX = x.numel();
+    int64_t sizeB = b.numel();
+    int64_t stepB = (b.numel()) ? x.stride(dim) : 1;
+
+    AT_DISPATCH_FLOATING_TYPES(x.scalar_type(), "bias_act_cpu", [&]
+    {
+        const scalar_t* px    = x.data_ptr<scalar_t>();
+        const scalar_t* pb    = (b.numel()) ? b.data_ptr<scalar_t>() : NULL;
+        const scalar_t* pxref = (xref.numel()) ? xref.data_ptr<scalar_t>() : NULL;
+        const scalar_t* pyref = (yref.numel()) ? yref.data_ptr<scalar_t>() : NULL;
+        const scalar_t* pdy   = (dy.numel()) ? dy.data_ptr<scalar_t>() : NULL;
+        scalar_t* py          = y.data_ptr<scalar_t>();
+
+        auto kernel = bias_act_kernel<scalar_t, 1>;
+        if (act == 2) kernel = bias_act_kernel<scalar_t, 2>;
+        if (act == 3) kernel = bias_act_kernel<scalar_t, 3>;
+        if (act == 4) kernel = bias_act_kernel<scalar_t, 4>;
+        if (act == 5) kernel = bias_act_kernel<scalar_t, 5>;
+        if (act == 6) kernel = bias_act_kernel<scalar_t, 6>;
+        if (act == 7) kernel = bias_act_kernel<scalar_t, 7>;
+        if (act == 8) kernel = bias_act_kernel<scalar_t, 8>;
+        if (act == 9) kernel = bias_act_kernel<scalar_t, 9>;
+
+        at::parallel_for(0, sizeX, 16384, [&](int64_t begin, int64_t end)
+        {
+            kernel(px, pb, pxref, pyref, pdy, py, grad, alpha, gain, clamp, begin, end, sizeB, stepB);
+        });
+    });
+    return y;
+}
+
+//------------------------------------------------------------------------
+
+PYBIND11_MODULE(TORCH_EXTENSION_NAME, m)
+{
+    m.def("bias_act", &bias_act);
+}
+
+//------------------------------------------------------------------------
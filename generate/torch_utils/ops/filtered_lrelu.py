@@ -32,6 +32,23 @@ def _init():
         )
     return True
 
+_cpu_plugin = None
+
+def _init_cpu():
+    global _cpu_plugin
+    if _cpu_plugin is None:
+        try:
+            _cpu_plugin = custom_ops.get_plugin(
+                module_name='filtered_lrelu_cpu_plugin',
+                sources=['filtered_lrelu_cpu.cpp'],
+                headers=['upfirdn2d_cpu.h'],
+                source_dir=os.path.dirname(__file__),
+            )
+        except Exception: # pylint: disable=broad-except
+            warnings.warn('Failed to build CPU plugin for filtered_lrelu. Falling back to the pure PyTorch implementation.')
+            _cpu_plugin = False
+    return _cpu_plugin is not False
+
 def _get_filter_size(f):
     if f is None:
         return 1, 1
@@ -83,7 +100,7 @@ def filtered_lrelu(x, fu=None, fd=None, b=None, up=1, down=1, padding=0, gain=np
     using standard PyTorch ops. It supports gradients of arbitrary order.
 
     Args:
-        x:           Float32/float16/float64 input tensor of the shape
+        x:           Float32/float16/float64/bfloat16 input tensor of the shape
                      `[batch_size, num_channels, in_height, in_width]`.
         fu:          Float32 upsampling FIR filter of the shape
                      `[filter_height, filter_width]` (non-separable),
@@ -104,15 +121,18 @@ def filtered_lrelu(x, fu=None, fd=None, b=None, up=1, down=1, padding=0, gain=np
         slope:       Slope on the negative side of leaky ReLU (default: 0.2).
         clamp:       Maximum magnitude for leaky ReLU output (default: None).
         flip_filter: False = convolution, True = correlation (default: False).
-        impl:        Implementation to use. Can be `'ref'` or `'cuda'` (default: `'cuda'`).
+        impl:        Implementation to use. Can be `'ref'`, `'cuda'` or `'cpu'` (default: `'cuda'`).
+                     `'cuda'` selects the `'cpu'` implementation for tensors on the CPU.
 
     Returns:
         Tensor of the shape `[batch_size, num_channels, out_height, out_width]`.
     """
     assert isinstance(x, torch.Tensor)
-    assert impl in ['ref', 'cuda']
+    assert impl in ['ref', 'cuda', 'cpu']
     if impl == 'cuda' and x.device.type == 'cuda' and _init():
         return _filtered_lrelu_cuda(up=up, down=down, padding=padding, gain=gain, slope=slope, clamp=clamp, flip_filter=flip_filter).apply(x, fu, fd, b, None, 0, 0)
+    if impl in ['cuda', 'cpu'] and x.device.type == 'cpu':
+        return _filtered_lrelu_cpu(x, fu=fu, fd=fd, b=b, up=up, down=down, padding=padding, gain=gain, slope=slope, clamp=clamp, flip_filter=flip_filter)
     return _filtered_lrelu_ref(x, fu=fu, fd=fd, b=b, up=up, down=down, padding=padding, gain=gain, slope=slope, clamp=clamp, flip_filter=flip_filter)
 
 #----------------------------------------------------------------------------
@@ -154,6 +174,68 @@ def _filtered_lrelu_ref(x, fu=None, fd=None, b=None, up=1, down=1, padding=0, ga
 
 #----------------------------------------------------------------------------
 
+@misc.profiled_function
+def _filtered_lrelu_cpu(x, fu=None, fd=None, b=None, up=1, down=1, padding=0, gain=np.sqrt(2), slope=0.2, clamp=None, flip_filter=False):
+    """Fast CPU implementation of `filtered_lrelu()`.
+
+    Uses the native CPU plugin when no gradients are needed, which processes one channel
+    plane at a time and never holds more than one upsampled plane per thread. Otherwise,
+    while tracing, or if the plugin could not be built, it falls back to the polyphase CPU implementation
+    of `upfirdn2d()`. `gain` is folded into the upsampling filter (leaky ReLU is positively
+    homogeneous), and leaky ReLU and clamp run in-place on the upsampled buffer.
+    """
+    assert isinstance(x, torch.Tensor) and x.ndim == 4
+    fu_w, fu_h = _get_filter_size(fu)
+    fd_w, fd_h = _get_filter_size(fd)
+    if b is not None:
+        assert isinstance(b, torch.Tensor) and b.dtype == x.dtype
+        misc.assert_shape(b, [x.shape[1]])
+    assert isinstance(up, int) and up >= 1
+    assert isinstance(down, int) and down >= 1
+    px0, px1, py0, py1 = _parse_padding(padding)
+    assert gain == float(gain) and gain > 0
+    assert slope == float(slope) and slope >= 0
+    assert clamp is None or (clamp == float(clamp) and clamp >= 0)
+
+    # Calculate output size.
+    batch_size, channels, in_h, in_w = x.shape
+    in_dtype = x.dtype
+    out_w = (in_w * up + (px0 + px1) - (fu_w - 1) - (fd_w - 1) + (down - 1)) // down
+    out_h = (in_h * up + (py0 + py1) - (fu_h - 1) - (fd_h - 1) + (down - 1)) // down
+
+    # Native plugin.
+    needs_grad = x.requires_grad or (b is not None and b.requires_grad)
+    if not needs_grad and x.dtype in [torch.float32, torch.float64] and not torch.jit.is_tracing() and _init_cpu():
+        fu = fu.to(torch.float32) if fu is not None else torch.ones([1, 1], dtype=torch.float32, device=x.device)
+        fd = fd.to(torch.float32) if fd is not None else torch.ones([1, 1], dtype=torch.float32, device=x.device)
+        if b is None:
+            b = torch.empty([0], dtype=x.dtype, device=x.device)
+        clamp = float(clamp if clamp is not None else -1)
+        x = _cpu_plugin.filtered_lrelu(x, fu, fd, b, up, down, px0, px1, py0, py1, float(gain), float(slope), clamp, flip_filter)
+        misc.assert_shape(x, [batch_size, channels, out_h, out_w])
+        return x
+
+    # Apply bias.
+    if b is not None:
+        x = x + b.reshape([1, -1, 1, 1])
+
+    # Upsample with gain, leaky ReLU, clamp.
+    x = upfirdn2d._upfirdn2d_cpu(x, fu, up=up, padding=[px0, px1, py0, py1], gain=float(gain)*up**2, flip_filter=flip_filter)
+    inplace = not x.requires_grad
+    x = torch.nn.functional.leaky_relu(x, negative_slope=float(slope), inplace=inplace)
+    if clamp is not None:
+        x = x.clamp_(-clamp, clamp) if inplace else x.clamp(-clamp, clamp)
+
+    # Downsample.
+    x = upfirdn2d._upfirdn2d_cpu(x, fd, down=down, flip_filter=flip_filter)
+
+    # Check output shape & dtype.
+    misc.assert_shape(x, [batch_size, channels, out_h, out_w])
+    assert x.dtype == in_dtype
+    return x
+
+#----------------------------------------------------------------------------
+
 _filtered_lrelu_cuda_cache = dict()
 
 def _filtered_lrelu_cuda(up=1, down=1, padding=0, gain=np.sqrt(2), slope=0.2, clamp=None, flip_filter=False):
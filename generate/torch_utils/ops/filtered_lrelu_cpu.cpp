@@ -0,0 +1,122 @@
+#include <torch/extension.h>
+#include <ATen/Parallel.h>
+#include <vector>
+#include "upfirdn2d_cpu.h"
+
+//------------------------------------------------------------------------
+// Fused bias, upsampling, leaky ReLU, clamp and downsampling, one plane at
+// a time. Only a single upsampled plane per thread is ever allocated.
+// Inference only: no sign tensor is written for gradient computation.
+
+static torch::Tensor filtered_lrelu(
+    torch::Tensor x, torch::Tensor fu, torch::Tensor fd, torch::Tensor b,
+    int up, int down, int px0, int px1, int py0, int py1, float gain, float slope, float clamp, bool flip_filter)
+{
+    // Validate arguments.
+    TORCH_CHECK(x.device().is_cpu(), "x must reside on CPU device");
+    TORCH_CHECK(fu.device() == x.device() && fd.device() == x.device() && b.device() == x.device(), "all input tensors must reside on the same device");
+    TORCH_CHECK(fu.dtype() == torch::kFloat && fd.dtype() == torch::kFloat, "fu and fd must be float32");
+    TORCH_CHECK(x.dtype() == torch::kFloat || x.dtype() == torch::kDouble, "x must be float32 or float64");
+    TORCH_CHECK(b.numel() == 0 || b.dtype() == x.dtype(), "x and b must have the same dtype");
+    TORCH_CHECK(x.dim() == 4, "x must be rank 4");
+    TORCH_CHECK(x.numel() > 0 && x.numel() <= INT_MAX, "x is empty or too large");
+    TORCH_CHECK((fu.dim() == 1 || fu.dim() == 2) && (fd.dim() == 1 || fd.dim() == 2), "fu and fd must be rank 1 or 2");
+    TORCH_CHECK(fu.numel() > 0 && fd.numel() > 0, "fu and fd must not be empty");
+    TORCH_CHECK(b.numel() == 0 || (b.dim() == 1 && b.size(0) == x.size(1)), "b must be empty or a vector with the same number of channels as x");
+    TORCH_CHECK(up >= 1 && down >= 1, "up and down must be at least 1");
+
+    x = x.contiguous();
+    fu = fu.contiguous();
+    fd = fd.contiguous();
+    b = b.contiguous();
+
+    // Input and filter sizes. Separable filters have the same number of taps in x and y.
+    int xw = (int)x.size(3);
+    int xh = (int)x.size(2);
+    int fuw = (int)fu.size(-1);
+    int fuh = (int)fu.size(0);
+    int fdw = (int)fd.size(-1);
+    int fdh = (int)fd.size(0);
+    bool fuSep = (fu.dim() == 1);
+    bool fdSep = (fd.dim() == 1);
+
+    // Size of upsampled buffer.
+    int cw = xw * up + px0 + px1 - fuw + 1;
+    int ch = xh * up + py0 + py1 - fuh + 1;
+    TORCH_CHECK(cw >= fdw && ch >= fdh, "upsampled buffer must be at least the size of downsampling filter");
+
+    // Compute output size and allocate.
+    int yw = (cw - fdw + down) / down;
+    int yh = (ch - fdh + down) / down;
+    TORCH_CHECK(yw > 0 && yh > 0, "output must be at least 1x1");
+    torch::Tensor y = torch::empty({x.size(0), x.size(1), yh, yw}, x.options());
+
+    int64_t channels = x.size(1);
+    int64_t planes = x.size(0) * channels;
+    const float* fup = fu.data_ptr<float>();
+    const float* fdp = fd.data_ptr<float>();
+
+    // Gain is folded into the upsampling filter, leaky ReLU is positively homogeneous.
+    float upGain = gain * (float)(up * up);
+
+    AT_DISPATCH_FLOATING_TYPES(x.scalar_type(), "filtered_lrelu_cpu", [&]
+    {
+        const scalar_t* xp = x.data_ptr<scalar_t>();
+        const scalar_t* bp = (b.numel()) ? b.data_ptr<scalar_t>() : NULL;
+        scalar_t* yp = y.data_ptr<scalar_t>();
+        scalar_t s = (scalar_t)slope;
+        scalar_t c = (scalar_t)clamp;
+
+        at::parallel_for(0, planes, 1, [&](int64_t begin, int64_t end)
+        {
+            std::vector<scalar_t> tmpU(fuSep ? (size_t)xh * cw : 0);
+            std::vector<scalar_t> buf((size_t)ch * cw);
+            std::vector<scalar_t> tmpD(fdSep ? (size_t)ch * yw : 0);
+
+            for (int64_t i = begin; i < end; i++)
+            {
+                const scalar_t* xi = xp + i * xh * xw;
+                scalar_t* yi = yp + i * yh * yw;
+                scalar_t bias = (bp) ? bp[i % channels] : 0;
+
+                // Add bias and upsample.
+                if (fuSep)
+                {
+                    upfirdn2d_plane<scalar_t>(xi, bias, xw, xh, tmpU.data(), cw, xh, fup, fuw, 1, flip_filter, up, 1, 1, 1, px0, 0, 1.0f);
+                    upfirdn2d_plane<scalar_t>(tmpU.data(), 0, cw, xh, buf.data(), cw, ch, fup, 1, fuh, flip_filter, 1, up, 1, 1, 0, py0, upGain);
+                }
+                else
+                    upfirdn2d_plane<scalar_t>(xi, bias, xw, xh, buf.data(), cw, ch, fup, fuw, fuh, flip_filter, up, up, 1, 1, px0, py0, upGain);
+
+                // Leaky ReLU and clamp.
+                for (size_t j = 0; j < buf.size(); j++)
+                {
+                    scalar_t v = buf[j];
+                    v = (v > 0) ? v : v * s;
+                    if (c >= 0)
+                        v = (v > c) ? c : (v < -c) ? -c : v;
+                    buf[j] = v;
+                }
+
+                // Downsample.
+                if (fdSep)
+                {
+                    upfirdn2d_plane<scalar_t>(buf.data(), 0, cw, ch, tmpD.data(), yw, ch, fdp, fdw, 1, flip_filter, 1, 1, down, 1, 0, 0, 1.0f);
+                    upfirdn2d_plane<scalar_t>(tmpD.data(), 0, yw, ch, yi, yw, yh, fdp, 1, fdh, flip_filter, 1, 1, 1, down, 0, 0, 1.0f);
+                }
+                else
+                    upfirdn2d_plane<scalar_t>(buf.data(), 0, cw, ch, yi, yw, yh, fdp, fdw, fdh, flip_filter, 1, 1, down, down, 0, 0, 1.0f);
+            }
+        });
+    });
+    return y;
+}
+
+//------------------------------------------------------------------------
+
+PYBIND11_MODULE(TORCH_EXTENSION_NAME, m)
+{
+    m.def("filtered_lrelu", &filtered_lrelu);
+}
+
+//------------------------------------------------------------------------
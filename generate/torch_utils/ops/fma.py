@@ -9,10 +9,13 @@
 """Fused multiply-add, with slightly faster gradients than `torch.addcmul()`."""
 
 import torch
+from .. import misc
 
 #----------------------------------------------------------------------------
 
 def fma(a, b, c): # => a * b + c
+    if misc.inference_only:
+        return torch.addcmul(c, a, b)
     return _FusedMultiplyAdd.apply(a, b, c)
 
 #----------------------------------------------------------------------------
@@ -12,6 +12,7 @@ Only works on 2D images and assumes
 `mode='bilinear'`, `padding_mode='zeros'`, `align_corners=False`."""
 
 import torch
+from .. import misc
 
 # pylint: disable=redefined-builtin
 # pylint: disable=arguments-differ
@@ -31,7 +32,7 @@ def grid_sample(input, grid):
 #----------------------------------------------------------------------------
 
 def _should_use_custom_op():
-    return enabled
+    return enabled and not misc.inference_only
 
 #----------------------------------------------------------------------------
 
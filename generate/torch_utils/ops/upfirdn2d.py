@@ -11,6 +11,7 @@
 import os
 import numpy as np
 import torch
+import warnings
 
 from .. import custom_ops
 from .. import misc
@@ -32,6 +33,26 @@ def _init():
         )
     return True
 
+_cpu_plugin = None
+
+def _init_cpu():
+    global _cpu_plugin
+    if _cpu_plugin is None:
+        try:
+            _cpu_plugin = custom_ops.get_plugin(
+                module_name='upfirdn2d_cpu_plugin',
+                sources=['upfirdn2d_cpu.cpp'],
+                headers=['upfirdn2d_cpu.h'],
+                source_dir=os.path.dirname(__file__),
+            )
+        except Exception: # pylint: disable=broad-except
+            warnings.warn('Failed to build CPU plugin for upfirdn2d. Falling back to the pure PyTorch implementation.')
+            _cpu_plugin = False
+    return _cpu_plugin is not False
+
+def _get_plugin(x):
+    return _plugin if x.device.type == 'cuda' else _cpu_plugin
+
 def _parse_scaling(scaling):
     if isinstance(scaling, int):
         scaling = [scaling, scaling]
@@ -135,7 +156,7 @@ def upfirdn2d(x, f, up=1, down=1, padding=0, flip_filter=False, gain=1, impl='cu
     using standard PyTorch ops. It supports gradients of arbitrary order.
 
     Args:
-        x:           Float32/float64/float16 input tensor of the shape
+        x:           Float32/float64/float16/bfloat16 input tensor of the shape
                      `[batch_size, num_channels, in_height, in_width]`.
         f:           Float32 FIR filter of the shape
                      `[filter_height, filter_width]` (non-separable),
@@ -150,15 +171,24 @@ def upfirdn2d(x, f, up=1, down=1, padding=0, flip_filter=False, gain=1, impl='cu
                      (default: 0).
         flip_filter: False = convolution, True = correlation (default: False).
         gain:        Overall scaling factor for signal magnitude (default: 1).
-        impl:        Implementation to use. Can be `'ref'` or `'cuda'` (default: `'cuda'`).
+        impl:        Implementation to use. Can be `'ref'`, `'cuda'` or `'cpu'` (default: `'cuda'`).
+                     `'cuda'` selects the `'cpu'` implementation for tensors on the CPU.
 
     Returns:
         Tensor of the shape `[batch_size, num_channels, out_height, out_width]`.
     """
     assert isinstance(x, torch.Tensor)
-    assert impl in ['ref', 'cuda']
+    assert impl in ['ref', 'cuda', 'cpu']
     if impl == 'cuda' and x.device.type == 'cuda' and _init():
+        if misc.inference_only:
+            return _upfirdn2d_plugin(x, f, up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain)
         return _upfirdn2d_cuda(up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain).apply(x, f)
+    if impl in ['cuda', 'cpu'] and x.device.type == 'cpu':
+        if x.dtype in [torch.float32, torch.float64] and not torch.jit.is_tracing() and _init_cpu():
+            if misc.inference_only:
+                return _upfirdn2d_plugin(x, f, up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain)
+            return _upfirdn2d_cuda(up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain).apply(x, f)
+        return _upfirdn2d_cpu(x, f, up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain)
     return _upfirdn2d_ref(x, f, up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain)
 
 #----------------------------------------------------------------------------
@@ -172,7 +202,7 @@ def _upfirdn2d_ref(x, f, up=1, down=1, padding=0, flip_filter=False, gain=1):
     if f is None:
         f = torch.ones([1, 1], dtype=torch.float32, device=x.device)
     assert isinstance(f, torch.Tensor) and f.ndim in [1, 2]
-    assert f.dtype == torch.float32 and not f.requires_grad
+    assert f.is_floating_point() and not f.requires_grad
     batch_size, num_channels, in_height, in_width = x.shape
     upx, upy = _parse_scaling(up)
     downx, downy = _parse_scaling(down)
@@ -193,7 +223,7 @@ def _upfirdn2d_ref(x, f, up=1, down=1, padding=0, flip_filter=False, gain=1):
     x = x[:, :, max(-pady0, 0) : x.shape[2] - max(-pady1, 0), max(-padx0, 0) : x.shape[3] - max(-padx1, 0)]
 
     # Setup filter.
-    f = f * (gain ** (f.ndim / 2))
+    f = f.to(torch.float32) * (gain ** (f.ndim / 2))
     f = f.to(x.dtype)
     if not flip_filter:
         f = f.flip(list(range(f.ndim)))
@@ -212,10 +242,109 @@ def _upfirdn2d_ref(x, f, up=1, down=1, padding=0, flip_filter=False, gain=1):
 
 #----------------------------------------------------------------------------
 
+def _pad_or_crop(x, padding):
+    padx0, padx1, pady0, pady1 = padding
+    if any(padding):
+        x = torch.nn.functional.pad(x, [max(padx0, 0), max(padx1, 0), max(pady0, 0), max(pady1, 0)])
+        x = x[:, :, max(-pady0, 0) : x.shape[2] - max(-pady1, 0), max(-padx0, 0) : x.shape[3] - max(-padx1, 0)]
+    return x
+
+@misc.profiled_function
+def _upfirdn2d_cpu(x, f, up=1, down=1, padding=0, flip_filter=False, gain=1):
+    """Fast CPU implementation of `upfirdn2d()` using standard PyTorch ops. Used when
+    the native CPU plugin is not available.
+
+    Channels are folded into the batch dimension, so the filter is never repeated per
+    channel. Upsampling uses polyphase decomposition: the filter is split into `up`**2
+    phase filters that run directly on the input as the output channels of a single
+    convolution, and the phases are interleaved afterwards. No zeros are inserted or
+    convolved. Without upsampling, a strided convolution evaluates only the kept pixels.
+    """
+    # Validate arguments.
+    assert isinstance(x, torch.Tensor) and x.ndim == 4
+    if f is None:
+        f = torch.ones([1, 1], dtype=torch.float32, device=x.device)
+    assert isinstance(f, torch.Tensor) and f.ndim in [1, 2]
+    assert f.is_floating_point() and not f.requires_grad
+    batch_size, num_channels, in_height, in_width = x.shape
+    upx, upy = _parse_scaling(up)
+    downx, downy = _parse_scaling(down)
+    padx0, padx1, pady0, pady1 = _parse_padding(padding)
+
+    # Check that upsampled buffer is not smaller than the filter.
+    upW = in_width * upx + padx0 + padx1
+    upH = in_height * upy + pady0 + pady1
+    assert upW >= f.shape[-1] and upH >= f.shape[0]
+
+    # Setup filter as convolution kernel.
+    f = f.to(torch.float32) * (gain ** (f.ndim / 2))
+    f = f.to(x.dtype)
+    if flip_filter:
+        f = f.flip(list(range(f.ndim)))
+
+    # Fold channels into the batch dimension and resample.
+    x = x.reshape([batch_size * num_channels, 1, in_height, in_width])
+    if f.ndim == 2:
+        x = _upfirdn2d_cpu_pass(x, f, upx, upy, downx, downy, padx0, padx1, pady0, pady1)
+    else:
+        x = _upfirdn2d_cpu_pass(x, f.unsqueeze(0), upx, 1, downx, 1, padx0, padx1, 0, 0)
+        x = _upfirdn2d_cpu_pass(x, f.unsqueeze(1), 1, upy, 1, downy, 0, 0, pady0, pady1)
+    return x.reshape([batch_size, num_channels, x.shape[2], x.shape[3]])
+
+def _upfirdn2d_cpu_pass(x, f, upx, upy, downx, downy, padx0, padx1, pady0, pady1):
+    fh, fw = f.shape
+    _, _, in_height, in_width = x.shape
+
+    # No upsampling: pad, then convolve only at the pixels that are kept.
+    if upx == 1 and upy == 1:
+        x = _pad_or_crop(x, [padx0, padx1, pady0, pady1])
+        return conv2d_gradfix.conv2d(input=x, weight=f.flip([0, 1])[np.newaxis, np.newaxis], stride=[downy, downx])
+
+    # Split the filter into upy * upx phase filters with mh * mw taps each.
+    mh = (fh + upy - 1) // upy
+    mw = (fw + upx - 1) // upx
+    f = torch.nn.functional.pad(f, [0, mw * upx - fw, 0, mh * upy - fh])
+    f = f.reshape([mh, upy, mw, upx]).permute(1, 3, 0, 2).flip([2, 3])
+    f = f.reshape([upy * upx, 1, mh, mw])
+
+    # Evaluate the phases as output channels of one convolution and interleave them.
+    x = torch.nn.functional.pad(x, [mw - 1, mw - 1, mh - 1, mh - 1])
+    x = conv2d_gradfix.conv2d(input=x, weight=f)
+    batch_size, _, qh, qw = x.shape
+    x = x.reshape([batch_size, upy, upx, qh, qw]).permute(0, 3, 1, 4, 2)
+    x = x.reshape([batch_size, 1, qh * upy, qw * upx])
+
+    # Pad or crop the full convolution to the requested window and downsample.
+    x = _pad_or_crop(x, [padx0 - fw + 1, padx1 - (qw - in_width) * upx, pady0 - fh + 1, pady1 - (qh - in_height) * upy])
+    return x[:, :, ::downy, ::downx]
+
+#----------------------------------------------------------------------------
+
+def _upfirdn2d_plugin(x, f, up=1, down=1, padding=0, flip_filter=False, gain=1):
+    """Calls the CUDA or CPU plugin directly, without autograd bookkeeping.
+    Only used in inference-only mode.
+    """
+    upx, upy = _parse_scaling(up)
+    downx, downy = _parse_scaling(down)
+    padx0, padx1, pady0, pady1 = _parse_padding(padding)
+
+    if f is None:
+        f = torch.ones([1, 1], dtype=torch.float32, device=x.device)
+    if f.ndim == 1 and f.shape[0] == 1:
+        f = f.square().unsqueeze(0) # Convert separable-1 into full-1x1.
+    plugin = _get_plugin(x)
+    if f.ndim == 2:
+        return plugin.upfirdn2d(x, f, upx, upy, downx, downy, padx0, padx1, pady0, pady1, flip_filter, gain)
+    x = plugin.upfirdn2d(x, f.unsqueeze(0), upx, 1, downx, 1, padx0, padx1, 0, 0, flip_filter, 1.0)
+    return plugin.upfirdn2d(x, f.unsqueeze(1), 1, upy, 1, downy, 0, 0, pady0, pady1, flip_filter, gain)
+
+#----------------------------------------------------------------------------
+
 _upfirdn2d_cuda_cache = dict()
 
 def _upfirdn2d_cuda(up=1, down=1, padding=0, flip_filter=False, gain=1):
-    """Fast CUDA implementation of `upfirdn2d()` using custom ops.
+    """Fast CUDA implementation of `upfirdn2d()` using custom ops. Also runs the
+    native CPU plugin for tensors on the CPU.
     """
     # Parse arguments.
     upx, upy = _parse_scaling(up)
@@ -239,10 +368,10 @@ def _upfirdn2d_cuda(up=1, down=1, padding=0, flip_filter=False, gain=1):
             assert isinstance(f, torch.Tensor) and f.ndim in [1, 2]
             y = x
             if f.ndim == 2:
-                y = _plugin.upfirdn2d(y, f, upx, upy, downx, downy, padx0, padx1, pady0, pady1, flip_filter, gain)
+                y = _get_plugin(y).upfirdn2d(y, f, upx, upy, downx, downy, padx0, padx1, pady0, pady1, flip_filter, gain)
             else:
-                y = _plugin.upfirdn2d(y, f.unsqueeze(0), upx, 1, downx, 1, padx0, padx1, 0, 0, flip_filter, 1.0)
-                y = _plugin.upfirdn2d(y, f.unsqueeze(1), 1, upy, 1, downy, 0, 0, pady0, pady1, flip_filter, gain)
+                y = _get_plugin(y).upfirdn2d(y, f.unsqueeze(0), upx, 1, downx, 1, padx0, padx1, 0, 0, flip_filter, 1.0)
+                y = _get_plugin(y).upfirdn2d(y, f.unsqueeze(1), 1, upy, 1, downy, 0, 0, pady0, pady1, flip_filter, gain)
             ctx.save_for_backward(f)
             ctx.x_shape = x.shape
             return y
@@ -293,7 +422,8 @@ def filter2d(x, f, padding=0, flip_filter=False, gain=1, impl='cuda'):
                      (default: 0).
         flip_filter: False = convolution, True = correlation (default: False).
         gain:        Overall scaling factor for signal magnitude (default: 1).
-        impl:        Implementation to use. Can be `'ref'` or `'cuda'` (default: `'cuda'`).
+        impl:        Implementation to use. Can be `'ref'`, `'cuda'` or `'cpu'` (default: `'cuda'`).
+                     `'cuda'` selects the `'cpu'` implementation for tensors on the CPU.
 
     Returns:
         Tensor of the shape `[batch_size, num_channels, out_height, out_width]`.
@@ -331,7 +461,8 @@ def upsample2d(x, f, up=2, padding=0, flip_filter=False, gain=1, impl='cuda'):
                      (default: 0).
         flip_filter: False = convolution, True = correlation (default: False).
         gain:        Overall scaling factor for signal magnitude (default: 1).
-        impl:        Implementation to use. Can be `'ref'` or `'cuda'` (default: `'cuda'`).
+        impl:        Implementation to use. Can be `'ref'`, `'cuda'` or `'cpu'` (default: `'cuda'`).
+                     `'cuda'` selects the `'cpu'` implementation for tensors on the CPU.
 
     Returns:
         Tensor of the shape `[batch_size, num_channels, out_height, out_width]`.
@@ -370,7 +501,8 @@ def downsample2d(x, f, down=2, padding=0, flip_filter=False, gain=1, impl='cuda'
                      (default: 0).
         flip_filter: False = convolution, True = correlation (default: False).
         gain:        Overall scaling factor for signal magnitude (default: 1).
-        impl:        Implementation to use. Can be `'ref'` or `'cuda'` (default: `'cuda'`).
+        impl:        Implementation to use. Can be `'ref'`, `'cuda'` or `'cpu'` (default: `'cuda'`).
+                     `'cuda'` selects the `'cpu'` implementation for tensors on the CPU.
 
     Returns:
         Tensor of the shape `[batch_size, num_channels, out_height, out_width]`.
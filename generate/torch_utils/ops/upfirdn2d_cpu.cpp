@@ -0,0 +1,61 @@
+#include <torch/extension.h>
+#include <ATen/Parallel.h>
+#include "upfirdn2d_cpu.h"
+
+//------------------------------------------------------------------------
+
+static torch::Tensor upfirdn2d(torch::Tensor x, torch::Tensor f, int upx, int upy, int downx, int downy, int padx0, int padx1, int pady0, int pady1, bool flip, float gain)
+{
+    // Validate arguments.
+    TORCH_CHECK(x.device().is_cpu(), "x must reside on CPU device");
+    TORCH_CHECK(f.device() == x.device(), "f must reside on the same device as x");
+    TORCH_CHECK(f.dtype() == torch::kFloat, "f must be float32");
+    TORCH_CHECK(x.dtype() == torch::kFloat || x.dtype() == torch::kDouble, "x must be float32 or float64");
+    TORCH_CHECK(x.numel() <= INT_MAX, "x is too large");
+    TORCH_CHECK(f.numel() <= INT_MAX, "f is too large");
+    TORCH_CHECK(x.numel() > 0, "x has zero size");
+    TORCH_CHECK(f.numel() > 0, "f has zero size");
+    TORCH_CHECK(x.dim() == 4, "x must be rank 4");
+    TORCH_CHECK(f.dim() == 2, "f must be rank 2");
+    TORCH_CHECK(f.size(0) >= 1 && f.size(1) >= 1, "f must be at least 1x1");
+    TORCH_CHECK(upx >= 1 && upy >= 1, "upsampling factor must be at least 1");
+    TORCH_CHECK(downx >= 1 && downy >= 1, "downsampling factor must be at least 1");
+
+    // Create output tensor.
+    x = x.contiguous();
+    f = f.contiguous();
+    int inW = (int)x.size(3);
+    int inH = (int)x.size(2);
+    int fw = (int)f.size(1);
+    int fh = (int)f.size(0);
+    int outW = (inW * upx + padx0 + padx1 - fw + downx) / downx;
+    int outH = (inH * upy + pady0 + pady1 - fh + downy) / downy;
+    TORCH_CHECK(outW >= 1 && outH >= 1, "output must be at least 1x1");
+    torch::Tensor y = torch::empty({x.size(0), x.size(1), outH, outW}, x.options());
+    TORCH_CHECK(y.numel() <= INT_MAX, "output is too large");
+
+    // Process one plane per task.
+    int64_t planes = x.size(0) * x.size(1);
+    const float* fp = f.data_ptr<float>();
+    AT_DISPATCH_FLOATING_TYPES(x.scalar_type(), "upfirdn2d_cpu", [&]
+    {
+        const scalar_t* xp = x.data_ptr<scalar_t>();
+        scalar_t* yp = y.data_ptr<scalar_t>();
+        at::parallel_for(0, planes, 1, [&](int64_t begin, int64_t end)
+        {
+            for (int64_t i = begin; i < end; i++)
+                upfirdn2d_plane<scalar_t>(xp + i * inH * inW, 0, inW, inH, yp + i * outH * outW, outW, outH,
+                    fp, fw, fh, flip, upx, upy, downx, downy, padx0, pady0, gain);
+        });
+    });
+    return y;
+}
+
+//------------------------------------------------------------------------
+
+PYBIND11_MODULE(TORCH_EXTENSION_NAME, m)
+{
+    m.def("upfirdn2d", &upfirdn2d);
+}
+
+//------------------------------------------------------------------------
@@ -0,0 +1,55 @@
+//------------------------------------------------------------------------
+// Helpers.
+
+// First filter tap that lands on a non-zero (i.e. original) pixel of the
+// upsampled image, given the upsampled coordinate of tap 0.
+static inline int upfirdn2d_first_tap(int base, int up)
+{
+    int k = (base < 0) ? -base : 0;
+    int r = (base + k) % up;
+    return (r == 0) ? k : k + up - r;
+}
+
+//------------------------------------------------------------------------
+// Upsample, pad, filter and downsample a single [inH, inW] plane into an
+// [outH, outW] plane. Only the filter taps that hit original pixels are
+// evaluated (polyphase), so the zeros inserted by upsampling are never
+// touched. `bias` is added to every original pixel before filtering.
+
+template <class T>
+static void upfirdn2d_plane(
+    const T* x, T bias, int inW, int inH,
+    T* y, int outW, int outH,
+    const float* f, int fw, int fh, bool flip,
+    int upx, int upy, int downx, int downy, int padx0, int pady0, float gain)
+{
+    for (int oy = 0; oy < outH; oy++)
+    {
+        int by = oy * downy - pady0;
+        int ky0 = upfirdn2d_first_tap(by, upy);
+        for (int ox = 0; ox < outW; ox++)
+        {
+            int bx = ox * downx - padx0;
+            int kx0 = upfirdn2d_first_tap(bx, upx);
+            T v = 0;
+            for (int ky = ky0; ky < fh; ky += upy)
+            {
+                int iy = (by + ky) / upy;
+                if (iy >= inH)
+                    break;
+                const T* xrow = x + (int64_t)iy * inW;
+                const float* frow = f + (int64_t)(flip ? ky : fh - 1 - ky) * fw;
+                for (int kx = kx0; kx < fw; kx += upx)
+                {
+                    int ix = (bx + kx) / upx;
+                    if (ix >= inW)
+                        break;
+                    v += (xrow[ix] + bias) * (T)frow[flip ? kx : fw - 1 - kx];
+                }
+            }
+            y[(int64_t)oy * outW + ox] = v * (T)gain;
+        }
+    }
+}
+
+//------------------------------------------------------------------------
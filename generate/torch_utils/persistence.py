@@ -13,6 +13,7 @@ during unpickling. This way, any previously exported pickles will remain
 usable even if the original code is no longer available, or if the current
 version of the code is not consistent with what was originally pickled."""
 
+import os
 import sys
 import pickle
 import io
@@ -20,6 +21,9 @@ import inspect
 import copy
 import uuid
 import types
+import hashlib
+import marshal
+import importlib.util
 import dnnlib
 
 #----------------------------------------------------------------------------
@@ -29,6 +33,7 @@ _decorators         = set()     # {decorator_class, ...}
 _import_hooks       = []        # [hook_function, ...]
 _module_to_src_dict = dict()    # {module: src, ...}
 _src_to_module_dict = dict()    # {src: module, ...}
+_bytecode_cache     = True      # cache the compiled module source on disk
 
 #----------------------------------------------------------------------------
 
@@ -218,14 +223,43 @@ def _src_to_module(src):
     """
     module = _src_to_module_dict.get(src, None)
     if module is None:
-        module_name = "_imported_module_" + uuid.uuid4().hex
+        src_hash = hashlib.sha256(src.encode('utf-8')).hexdigest()
+        module_name = "_imported_module_" + src_hash[:32]
+        if module_name in sys.modules:
+            module_name = "_imported_module_" + uuid.uuid4().hex
         module = types.ModuleType(module_name)
         sys.modules[module_name] = module
         _module_to_src_dict[module] = src
         _src_to_module_dict[src] = module
-        exec(src, module.__dict__) # pylint: disable=exec-used
+        exec(_compile_src(src, src_hash), module.__dict__) # pylint: disable=exec-used
     return module
 
+def _compile_src(src, src_hash):
+    r"""Compile the given module source, using the on-disk bytecode cache
+    keyed by the source hash and the Python bytecode version.
+    """
+    filename = f'<persistence {src_hash[:16]}>'
+    if not _bytecode_cache:
+        return compile(src, filename, 'exec')
+
+    cache_file = dnnlib.util.make_cache_dir_path('persistence', f'{src_hash}-{importlib.util.MAGIC_NUMBER.hex()}.bin')
+    try:
+        with open(cache_file, 'rb') as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    code = compile(src, filename, 'exec')
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = f'{cache_file}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_file, 'wb') as f:
+            marshal.dump(code, f)
+        os.replace(tmp_file, cache_file) # Atomic, so concurrent processes never read a partial file.
+    except OSError:
+        pass
+    return code
+
 #----------------------------------------------------------------------------
 
 def _check_pickleable(obj):
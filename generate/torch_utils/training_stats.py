@@ -76,6 +76,9 @@ def report(name, value):
     Returns:
         The same `value` that was passed in.
     """
+    if misc.inference_only:
+        return value
+
     if name not in _counters:
         _counters[name] = dict()
 